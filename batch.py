@@ -0,0 +1,131 @@
+#! /usr/bin/python3
+
+"""
+en/decrypt lots of (message, keyfile) pairs in one go, spread over a
+pool of worker processes.
+
+The manifest lists one job per line, either as CSV with a header row:
+
+  msgfile,keyfile,direction,outfile
+  msgs/a.txt,keys/alice,encrypt,out/a.enc
+
+or as JSON lines (.jsonl):
+
+  {"msgfile": "out/a.enc", "keyfile": "keys/alice",
+   "direction": "decrypt", "outfile": "out/a.txt"}
+
+direction is encrypt or decrypt (e/d also work, default encrypt). Each
+worker reads a keyfile once and keeps it for later jobs. Results are
+reported in manifest order, one line per job, then a summary.
+"""
+
+from sea import *
+from concurrent.futures import ProcessPoolExecutor
+import click
+import json
+import csv
+import time
+import os
+
+FIELDS = ["msgfile", "keyfile", "direction", "outfile"]
+
+@click.command()
+@click.argument('manifest')
+@click.option('-j','--jobs',default=0,
+              help="number of worker processes (default: one per core)")
+@click.option('--engine',type=click.Choice(['fast','deck']),default='fast',
+              help="keystream engine: integer-permutation (fast) or Card/Deck")
+def main(manifest,jobs,engine):
+  """run every job in the manifest file, report how each one went"""
+  joblist = readManifest(manifest)
+  if jobs < 1:
+    jobs = os.cpu_count() or 1
+  start = time.time()
+  results = runJobs(joblist, jobs, engine=='fast')
+  secs = time.time() - start
+  nletters = 0
+  nfailed = 0
+  for job, result in zip(joblist, results):
+    ok, letters, message = result
+    if ok:
+      nletters += letters
+      print("ok   %s -> %s (%d letters)" % (job["msgfile"], job["outfile"], letters))
+    else:
+      nfailed += 1
+      print("FAIL %s: %s" % (job["msgfile"], message))
+  print("%d jobs, %d failed, %d letters in %.2f secs (%d letters/sec, %d workers)"
+        % (len(joblist), nfailed, nletters, secs, nletters/max(secs,1e-9), jobs))
+  if nfailed > 0:
+    raise SystemExit(1)
+
+# ------------------------------------------------- #
+
+def readManifest(fn):
+  """read a CSV or JSON-lines manifest, return list of job dicts"""
+  inf = open(fn, "r")
+  if fn.endswith(".jsonl") or fn.endswith(".json"):
+    joblist = [json.loads(line) for line in inf if line.strip() != ""]
+  else:
+    rows = [row for row in csv.reader(inf) if len(row) > 0]
+    if len(rows) > 0 and rows[0][0].strip() == "msgfile":
+      header = [field.strip() for field in rows[0]]
+      rows = rows[1:]
+    else:
+      header = FIELDS
+    joblist = [dict(zip(header, [field.strip() for field in row])) for row in rows]
+  inf.close()
+  for job in joblist:
+    for field in FIELDS:
+      job.setdefault(field, "encrypt" if field=="direction" else "")
+  return joblist
+
+def runJobs(joblist, jobs, fast=True):
+  """run jobs in a pool of worker processes, return results in order"""
+  if jobs == 1:
+    return [runJob(job, fast) for job in joblist]
+  chunksize = max(1, len(joblist)//(jobs*8))
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    return list(pool.map(runJob, joblist, [fast]*len(joblist),
+                         chunksize=chunksize))
+
+_keys = {}   # keyfile -> FastDeck, kept for the life of each worker
+
+def loadKey(fn):
+  """return the (cached) starting deck from keyfile fn"""
+  if fn not in _keys:
+    if not os.path.exists(fn):
+      raise Exception("Keyfile (%s) not found." % (fn))
+    _keys[fn] = FastDeck(readCards(fn).getOrder())
+  return _keys[fn]
+
+def runJob(job, fast=True):
+  """
+  do one en/decryption job, return (ok, number of letters, error
+  message). Errors are returned, not raised, so one bad job doesn't
+  stop the others.
+  """
+  try:
+    direction = job["direction"].lower()
+    if direction not in ["encrypt", "decrypt", "e", "d"]:
+      raise Exception("direction (%s) should be encrypt or decrypt" % (direction))
+    if job["outfile"] == "":
+      raise Exception("no outfile given")
+    if fast:
+      d = loadKey(job["keyfile"]).copy()
+    else:
+      d = loadKey(job["keyfile"]).toDeck()
+    inf = open(job["msgfile"], "r")
+    msg = inf.read()
+    inf.close()
+    result = crypt(msg, d, direction[0]=="e", fast)
+    ofile = open(job["outfile"], "w")
+    ofile.write(result + "\n")
+    ofile.close()
+    return (True, len(result) - result.count(" "), "")
+  except Exception as e:
+    return (False, 0, str(e))
+
+# --------------------------------------- #
+
+if __name__ == "__main__":
+  main()
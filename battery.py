@@ -0,0 +1,194 @@
+#! /usr/bin/python3
+
+"""
+statistical tests of keystream quality over lots of shuffled decks
+
+Worker processes each take a range of decks, shuffle deck i with a
+random.Random seeded from (seed, i), make keystream from it a block at
+a time, and add the block into NumPy count arrays -- no keystream is
+kept around. The counts from all workers are added up and tested:
+
+  letters   chi-square of the 26 letter counts against uniform
+  digrams   chi-square of the 676 pair counts (next letter, same deck)
+  serial    lag-1 serial correlation of letter values (0-25)
+  runs      Wald-Wolfowitz runs test on letters above/below the middle
+
+The same seed gives the same decks and the same results, whatever
+the number of workers.
+
+  ./battery.py --decks 1000 --letters 100000 --seed 7 -j 8
+"""
+
+from sea import *
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+import random
+import click
+import json
+import math
+import os
+
+BLOCK = 2**16     # keystream letters made (and counted) at a time
+
+@click.command()
+@click.option('--decks',default=100,help="number of shuffled decks")
+@click.option('--letters',default=10000,help="keystream letters per deck")
+@click.option('--seed',default=0,help="seed for the deck shuffles")
+@click.option('-j','--jobs',default=0,
+              help="number of worker processes (default: one per core)")
+@click.option('--json','asjson',is_flag=True,help="print results as JSON")
+def main(decks,letters,seed,jobs,asjson):
+  """generate keystream in parallel, then run the tests on the counts"""
+  if decks < 1:
+    raise click.BadParameter("need at least 1 deck", param_hint="--decks")
+  if letters < 2:
+    raise click.BadParameter("need at least 2 letters a deck (for the pair "
+                             "tests)", param_hint="--letters")
+  if jobs < 1:
+    jobs = os.cpu_count() or 1
+  counts = runCounts(decks, letters, seed, jobs)
+  results = runTests(counts)
+  if asjson:
+    print(json.dumps(results, indent=2))
+  else:
+    print("%d decks x %d letters, seed %d" % (decks, letters, seed))
+    for name in results:
+      result = results[name]
+      print("%-8s %-11s %14.4f  df %-4s p %.4f" % (name, result["statistic"],
+            result["value"], result.get("df", "-"), result["p"]))
+
+# ------------------------------------------------- #
+
+def seededDeck(seed, i):
+  """deck number i for the given seed, as a FastDeck"""
+  d = Deck()
+  d.shuffle(random.Random("%d:%d" % (seed, i)))
+  return FastDeck.fromDeck(d)
+
+def emptyCounts():
+  """all the counts the tests need, zeroed"""
+  return {"letters": numpy.zeros(26, numpy.int64),
+          "digrams": numpy.zeros(26*26, numpy.int64),
+          "n": 0, "sum": 0, "sumsq": 0,
+          "pairs": 0, "sumxy": 0, "sumx": 0, "sumy": 0,
+          "high": 0, "runs": 0, "sequences": 0}
+
+def addCounts(total, counts):
+  """add counts into total (both from emptyCounts)"""
+  for name in total:
+    total[name] = total[name] + counts[name]
+
+def countDecks(args):
+  """make keystream for decks first..last-1, return the counts"""
+  seed, first, last, letters = args
+  counts = emptyCounts()
+  for i in range(first, last):
+    fd = seededDeck(seed, i)
+    counts["sequences"] += 1
+    previous = None
+    left = letters
+    while left > 0:
+      block = fd.generateKeystream(min(BLOCK, left))
+      left -= len(block)
+      x = numpy.frombuffer(block.encode(), numpy.uint8).astype(numpy.int64) - 65
+      if previous != None:
+        x = numpy.concatenate(([previous], x))
+        fresh = x[1:]
+      else:
+        fresh = x
+      countBlock(counts, x, fresh)
+      previous = x[-1]
+  return counts
+
+def countBlock(counts, x, fresh):
+  """
+  add one block to counts. fresh is the new letters; x may start with
+  the last letter of the block before, so pairs/runs carry over.
+  """
+  counts["letters"] += numpy.bincount(fresh, minlength=26)
+  counts["n"] += len(fresh)
+  counts["sum"] += int(fresh.sum())
+  counts["sumsq"] += int((fresh*fresh).sum())
+  high = fresh >= 13
+  counts["high"] += int(high.sum())
+  # a new run starts at each change; the first letter of a deck starts one
+  xhigh = x >= 13
+  counts["runs"] += int((xhigh[1:] != xhigh[:-1]).sum())
+  if len(x) == len(fresh):
+    counts["runs"] += 1
+  if len(x) > 1:
+    a = x[:-1]
+    b = x[1:]
+    counts["digrams"] += numpy.bincount(a*26 + b, minlength=26*26)
+    counts["pairs"] += len(a)
+    counts["sumxy"] += int((a*b).sum())
+    counts["sumx"] += int(a.sum())
+    counts["sumy"] += int(b.sum())
+
+def runCounts(decks, letters, seed, jobs):
+  """spread the decks over jobs workers, return the added-up counts"""
+  if decks < 1 or letters < 2 or jobs < 1:
+    raise Exception("need at least 1 deck, 2 letters a deck and 1 job...")
+  nchunks = min(decks, jobs*4)
+  bounds = [decks*i//nchunks for i in range(nchunks+1)]
+  args = [(seed, bounds[i], bounds[i+1], letters) for i in range(nchunks)]
+  total = emptyCounts()
+  if jobs == 1:
+    results = map(countDecks, args)
+    for counts in results:
+      addCounts(total, counts)
+    return total
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    for counts in pool.map(countDecks, args):
+      addCounts(total, counts)
+  return total
+
+def chiSquareP(chisq, df):
+  """upper tail p-value of chi-square (Wilson-Hilferty approximation)"""
+  z = ((chisq/df)**(1/3) - (1 - 2/(9*df))) / math.sqrt(2/(9*df))
+  return normalP(z)
+
+def normalP(z):
+  """upper tail p-value of a standard normal z"""
+  return 0.5*math.erfc(z/math.sqrt(2))
+
+def chiSquare(observed):
+  """chi-square statistic of observed counts against all equally likely"""
+  expected = observed.sum()/len(observed)
+  return float(((observed - expected)**2).sum()/expected)
+
+def runTests(counts):
+  """run each test on the counts, return dict of test -> results"""
+  results = {}
+  chisq = chiSquare(counts["letters"])
+  results["letters"] = {"statistic": "chi-square", "value": chisq,
+                        "df": 25, "p": chiSquareP(chisq, 25)}
+  chisq = chiSquare(counts["digrams"])
+  results["digrams"] = {"statistic": "chi-square", "value": chisq,
+                        "df": 675, "p": chiSquareP(chisq, 675)}
+  m = counts["pairs"]
+  cov = counts["sumxy"]/m - (counts["sumx"]/m)*(counts["sumy"]/m)
+  mean = counts["sum"]/counts["n"]
+  var = counts["sumsq"]/counts["n"] - mean*mean
+  r = cov/var
+  results["serial"] = {"statistic": "r (lag 1)", "value": r,
+                       "p": 2*normalP(abs(r)*math.sqrt(m))}
+  # runs of letters above/below the middle (N-Z vs A-M), each deck on
+  # its own: a deck of L letters has 1 run plus a change at each of its
+  # L-1 pairs, with chance 2pq (p = n1/n high, q = 1-p). Two pairs next
+  # to each other both change with chance pq, hence the covariance.
+  n1 = counts["high"]
+  n = counts["n"]
+  k = counts["sequences"]
+  pq = n1*(n - n1)/(n*n)
+  change = 2*pq
+  expected = k + change*(n - k)
+  variance = (n - k)*change*(1 - change) + 2*max(n - 2*k, 0)*(pq - change*change)
+  z = (counts["runs"] - expected)/math.sqrt(variance)
+  results["runs"] = {"statistic": "runs z", "value": z, "p": 2*normalP(abs(z))}
+  return results
+
+# --------------------------------------- #
+
+if __name__ == "__main__":
+  main()
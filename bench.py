@@ -0,0 +1,289 @@
+#! /usr/bin/python3
+
+"""
+benchmarks for the deck operations and keystream/en-decryption speed
+
+  ./bench.py                          # print the results
+  ./bench.py -o results.json          # ...and save them
+  ./bench.py --baseline results.json  # flag anything slower than before
+
+Each result is a rate (operations, letters or characters per second)
+plus the peak memory allocated while it ran (from tracemalloc, measured
+in a separate pass so it doesn't slow down the timing). Anything more
+than --tolerance slower than the baseline is flagged, and the exit
+status is 1.
+"""
+
+from sea import *
+from shoe import Shoe
+try:
+  import lockstep
+except ImportError:
+  lockstep = None     # no NumPy, no batch keystream benchmarks
+import subprocess
+import tracemalloc
+import sys
+import os
+import platform
+import random
+import click
+import json
+import time
+
+@click.command()
+@click.option('--sizes',default="1000,10000,100000",
+              help="comma-separated keystream/message sizes (letters)")
+@click.option('--repeat',default=3,
+              help="times to run each benchmark (best one is kept)")
+@click.option('-o','--outfile',default='',
+              help="save results to this JSON file")
+@click.option('--baseline',default='',
+              help="JSON results file to compare against")
+@click.option('--tolerance',default=0.2,
+              help="fraction slower than baseline that counts as a regression")
+def main(sizes,repeat,outfile,baseline,tolerance):
+  """run all the benchmarks, print/save/compare the results"""
+  sizes = [int(size) for size in sizes.split(",")]
+  results = runAll(sizes, repeat)
+  for name in results:
+    result = results[name]
+    print("%-32s %14.0f %-13s %10.1f KB peak" % (name, result["rate"],
+          result["unit"], result["peakbytes"]/1024))
+  if outfile != '':
+    ofile = open(outfile, "w")
+    json.dump({"python": platform.python_version(), "time": time.ctime(),
+               "results": results}, ofile, indent=2)
+    ofile.close()
+  if baseline != '':
+    inf = open(baseline, "r")
+    old = json.load(inf)["results"]
+    inf.close()
+    regressions = compare(results, old, tolerance)
+    for name, rate, oldrate in regressions:
+      print("REGRESSION %s: %.0f vs baseline %.0f (%.0f%% slower)" %
+            (name, rate, oldrate, 100*(1 - rate/oldrate)))
+    if len(regressions) > 0:
+      raise SystemExit(1)
+    print("no regressions against %s" % (baseline))
+
+# ------------------------------------------------- #
+
+def measure(func, count, repeat, unit):
+  """
+  time func() (which does count operations) repeat times, then once
+  more under tracemalloc. Returns dict of best rate and peak bytes.
+  """
+  best = None
+  for i in range(repeat):
+    start = time.perf_counter()
+    func()
+    secs = time.perf_counter() - start
+    if best == None or secs < best:
+      best = secs
+  tracemalloc.start()
+  func()
+  size, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return {"rate": count/max(best, 1e-9), "unit": unit, "peakbytes": peak,
+          "count": count}
+
+def shuffledDeck(seed=1):
+  """a full deck in a repeatable random order"""
+  rng = random.Random(seed)
+  cards = [Card(r, s) for s in "CDHS" for r in "A23456789TJQK"]
+  cards += [Card("L","J"), Card("B","J")]
+  rng.shuffle(cards)
+  return Deck("".join([str(c) for c in cards]))
+
+def deckOps(nops, repeat):
+  """benchmarks for the single Deck operations"""
+  d = shuffledDeck()
+  order = d.getOrder()
+  rng = random.Random(2)
+  spots = [rng.randrange(54) for i in range(nops)]
+  def moveDown1():
+    for i in spots:
+      d.moveDown1(i)
+  def tripleCut():
+    for i in range(nops):
+      first, second = d.findJokers()
+      d.tripleCut(first, second)
+  def countCut():
+    for i in range(nops):
+      d.countCut()
+  def outputCard():
+    for i in range(nops):
+      d.outputCard()
+  def getIndex():
+    for i in range(nops):
+      d.getIndex("LJ")
+      d.getIndex("BJ")
+  def findJokers():
+    for i in range(nops):
+      d.findJokers()
+  def construct():
+    for i in range(nops//10):
+      Deck(order)
+  def fromOrder():
+    for i in range(nops//10):
+      Deck.fromOrder(order)
+  results = {}
+  for func in [moveDown1, tripleCut, countCut, outputCard, getIndex,
+               findJokers]:
+    results["Deck." + func.__name__] = measure(func, nops, repeat, "ops/sec")
+  results["Deck(order)"] = measure(construct, nops//10, repeat, "decks/sec")
+  results["Deck.fromOrder"] = measure(fromOrder, nops//10, repeat, "decks/sec")
+  return results
+
+def shoeOps(nops, repeat):
+  """benchmarks for dealing from an 8-deck Shoe"""
+  s = Shoe(8, seed=1)
+  def dealCard():
+    s.reset()
+    for i in range(nops):
+      if s.isEmpty():
+        s.reset()
+      s.dealCard()
+  def deal():
+    s.reset()
+    for i in range(nops//52):
+      if len(s) < 52:
+        s.reset()
+      s.deal(52)
+  def reshuffle():
+    for i in range(nops//1000):
+      s.reshuffle()
+  results = {}
+  results["Shoe.dealCard"] = measure(dealCard, nops, repeat, "cards/sec")
+  results["Shoe.deal(52)"] = measure(deal, nops//52*52, repeat, "cards/sec")
+  results["Shoe.reshuffle"] = measure(reshuffle, nops//1000, repeat, "shuffles/sec")
+  return results
+
+def keystream(sizes, repeat):
+  """benchmarks for generateKeystream, Card/Deck and fast engines"""
+  order = shuffledDeck().getOrder()
+  results = {}
+  for n in sizes:
+    for fast in [False, True]:
+      name = "generateKeystream(%s,%d)" % ("fast" if fast else "deck", n)
+      func = lambda: generateKeystream(Deck(order), n, fast)
+      # the Card/Deck path is slow: don't repeat the really long runs
+      runs = repeat if fast or n <= 10**4 else 1
+      results[name] = measure(func, n, runs, "letters/sec")
+  return results
+
+def batchKeystream(ndecks, n, repeat):
+  """benchmarks for n letters from ndecks decks, one at a time and in lockstep"""
+  rng = random.Random(4)
+  decks = []
+  for i in range(ndecks):
+    d = FastDeck()
+    d.setPerm(rng.sample(range(54), 54))
+    decks.append(d)
+  def oneAtATime():
+    for d in decks:
+      d.copy().generateKeystream(n)
+  def inLockstep():
+    lockstep.KeystreamBatch(decks).generateKeystreams(n)
+  results = {}
+  name = "%d decks x %d letters" % (ndecks, n)
+  results["FastDeck(%s)" % name] = measure(oneAtATime, ndecks*n, repeat, "letters/sec")
+  results["KeystreamBatch(%s)" % name] = measure(inLockstep, ndecks*n, repeat,
+                                                 "letters/sec")
+  return results
+
+def pipeline(sizes, repeat):
+  """benchmarks for whole messages: in-process, and running sea.py"""
+  rng = random.Random(3)
+  order = shuffledDeck().getOrder()
+  results = {}
+  for n in sizes:
+    msg = "".join([rng.choice("abcdefghijklmnopqrstuvwxyz ,.\n") for i in range(n)])
+    results["crypt(%d)" % n] = measure(lambda: crypt(msg, Deck(order)), n,
+                                       repeat, "chars/sec")
+    fn = "bench_msg.txt"
+    ofile = open(fn, "w")
+    ofile.write(msg)
+    ofile.close()
+    kfn = "bench_key.txt"
+    ofile = open(kfn, "w")
+    ofile.write(order + "\n")
+    ofile.close()
+    seapy = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sea.py")
+    command = [sys.executable, seapy, "-k", kfn, "-m", fn, "-o", fn+".out"]
+    # tracemalloc can't see into the child process, so no peak here
+    best = None
+    for i in range(repeat):
+      start = time.perf_counter()
+      subprocess.run(command, check=True)
+      secs = time.perf_counter() - start
+      if best == None or secs < best:
+        best = secs
+    results["sea.py(%d)" % n] = {"rate": n/best, "unit": "chars/sec",
+                                 "peakbytes": 0, "count": n}
+    for name in [fn, kfn, fn+".out"]:
+      os.remove(name)
+  return results
+
+def startup(repeat, nmessages=200):
+  """
+  benchmarks for starting up: a bare python, importing sea, sea.py
+  --help, and many short messages through one sea.py --pipe
+  """
+  here = os.path.dirname(os.path.abspath(__file__))
+  seapy = os.path.join(here, "sea.py")
+  kfn = "bench_key.txt"
+  ofile = open(kfn, "w")
+  ofile.write(shuffledDeck().getOrder() + "\n")
+  ofile.close()
+  msgs = "".join(["message number %d\n" % (i) for i in range(nmessages)])
+  commands = [("python startup", [sys.executable, "-c", "pass"], 1, None),
+              ("import sea", [sys.executable, "-c", "import sea"], 1, None),
+              ("sea.py --help", [sys.executable, seapy, "--help"], 1, None),
+              ("sea.py --pipe(%d msgs)" % (nmessages),
+               [sys.executable, seapy, "-k", kfn, "--pipe", "lines"],
+               nmessages, msgs.encode())]
+  results = {}
+  for name, command, count, stdin in commands:
+    # tracemalloc can't see into the child process, so no peak here
+    best = None
+    for i in range(repeat):
+      start = time.perf_counter()
+      subprocess.run(command, input=stdin, cwd=here, check=True,
+                     stdout=subprocess.DEVNULL)
+      secs = time.perf_counter() - start
+      if best == None or secs < best:
+        best = secs
+    unit = "starts/sec" if count == 1 else "msgs/sec"
+    results[name] = {"rate": count/best, "unit": unit, "peakbytes": 0,
+                     "count": count}
+  os.remove(kfn)
+  return results
+
+def runAll(sizes, repeat):
+  """run every benchmark, return dict of name -> result"""
+  results = {}
+  results.update(startup(repeat))
+  results.update(deckOps(10000, repeat))
+  results.update(shoeOps(100000, repeat))
+  results.update(keystream(sizes, repeat))
+  if lockstep != None:
+    results.update(batchKeystream(1000, 300, repeat))
+  results.update(pipeline(sizes, repeat))
+  return results
+
+def compare(results, baseline, tolerance):
+  """return (name, rate, baseline rate) for each benchmark that slowed down"""
+  regressions = []
+  for name in results:
+    if name in baseline:
+      rate = results[name]["rate"]
+      oldrate = baseline[name]["rate"]
+      if rate < oldrate*(1 - tolerance):
+        regressions.append((name, rate, oldrate))
+  return regressions
+
+# --------------------------------------- #
+
+if __name__ == "__main__":
+  main()
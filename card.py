@@ -6,26 +6,56 @@ Spring 2019
 """
 
 class Card(object):
-  """card object for playing cards"""
-
-  def __init__(self, rank, suit):
-    """create playing card, given rank and suit"""
-    rank = rank.upper()
-    suit = suit.upper()
-    self.ranks = list("A23456789TJQKBL")
-    self.suits = list("CDHSJ")
-    if (rank in self.ranks) and (suit in self.suits):
+  """
+  card object for playing cards. Cards are shared: Card("Q","H") always
+  returns the same object, and each card knows its ordinal (sort order,
+  0-53: AC..KC, AD..KD, AH..KH, AS..KS, BJ, LJ) and its solitaire
+  value (1-52, with 53 for either joker).
+  """
+
+  __slots__ = ("rank", "suit", "ordinal", "value")
+  ranks = "A23456789TJQKBL"
+  suits = "CDHSJ"
+  _interned = {}
+
+  def __new__(cls, rank, suit):
+    """return the playing card for given rank and suit"""
+    card = Card._interned.get((rank, suit))
+    if card != None:
+      return card
+    urank = rank.upper()
+    usuit = suit.upper()
+    card = Card._interned.get((urank, usuit))
+    if card == None:
+      card = object.__new__(cls)
+      card._setup(urank, usuit)
+      Card._interned[(urank, usuit)] = card
+    Card._interned[(rank, suit)] = card
+    return card
+
+  def _setup(self, rank, suit):
+    """check rank and suit, precompute ordinal and value"""
+    if (rank in self.ranks) and (suit in self.suits) and \
+        len(rank)==1 and len(suit)==1:
       if suit=="J":
         if (rank!="B") and (rank!="L"):
           raise Exception("Joker rank (%s) must be Big (B) or Little (L)..." % (rank))
+        self.ordinal = 52 + "BL".index(rank)
+        self.value = 53
       else:
         if (rank=="B") or (rank=="L"):
           raise Exception("Non-joker rank (%s) must be A23..TJQK." % (rank))
+        self.ordinal = self.suits.index(suit)*13 + self.ranks.index(rank)
+        self.value = self.ordinal + 1
       self.rank = rank
       self.suit = suit
     else:
       raise Exception("Odd rank (%s) or suit (%s)..." % (rank,suit))
 
+  def __reduce__(self):
+    """pickle as Card(rank,suit) so unpickled cards are shared too"""
+    return (Card, (self.rank, self.suit))
+
   def __str__(self):
     """return string representation of playing card"""
     return self.rank+self.suit
@@ -35,15 +65,15 @@ class Card(object):
 
   def __hash__(self):
     """to help with comparing cards"""
-    return hash((self.rank, self.suit))
+    return self.ordinal
 
   def __eq__(self, other):
     """to allow comparing cards to see if equal"""
-    return hash(self) == hash(other)
+    return isinstance(other, Card) and self.ordinal == other.ordinal
 
   def __ne__(self, other):
     """allow comparing cards...see if != """
-    return hash(self) != hash(other)
+    return not self.__eq__(other)
 
   def getRank(self):
     """getter for card rank"""
@@ -55,57 +85,41 @@ class Card(object):
 
   def rankNum(self):
     """convert card rank to number 1-13 (A->K)"""
-    ranks = list("A23456789TJQK")
-    if self.rank in ranks:
-      number = ranks.index(self.rank) + 1
-      return number
+    if self.ordinal < 52:
+      return self.ordinal%13 + 1
     raise Exception("Card rank (%s) not valid (1-13)..." % self.rank)
 
   def suitNum(self):
     """convert card suit to number: C=0,D=1,H=2,S=3"""
-    suits = list("CDHS")
-    if self.suit in suits:
-      number = suits.index(self.suit)
-      return number
+    if self.ordinal < 52:
+      return self.ordinal//13
     raise Exception("Card suit (%s) not valid (CDHS)..." % self.suit)
 
   def __lt__(self, oc):
     """allow comparing cards...all clubs, then D, H, S, Jokers"""
     if isinstance(oc, Card):
-      if self.suit == oc.suit:
-        return self.ranks.index(self.rank) < self.ranks.index(oc.rank)
-      else:
-        return self.suits.index(self.suit) < self.suits.index(oc.suit)
+      return self.ordinal < oc.ordinal
     else:
       raise Exception("Other card is not a card...")
 
   def __gt__(self, oc):
     """allow comparing cards...all clubs, then D, H, S, Jokers"""
     if isinstance(oc, Card):
-      if self.suit == oc.suit:
-        return self.ranks.index(self.rank) > self.ranks.index(oc.rank)
-      else:
-        return self.suits.index(self.suit) > self.suits.index(oc.suit)
+      return self.ordinal > oc.ordinal
     else:
       raise Exception("Other card is not a card...")
 
   def __le__(self, oc):
     """allow comparing cards...all clubs, then D, H, S, Jokers"""
     if isinstance(oc, Card):
-      if self.suit == oc.suit:
-        return self.ranks.index(self.rank) <= self.ranks.index(oc.rank)
-      else:
-        return self.suits.index(self.suit) <= self.suits.index(oc.suit)
+      return self.ordinal <= oc.ordinal
     else:
       raise Exception("Other card is not a card...")
 
   def __ge__(self, oc):
     """allow comparing cards...all clubs, then D, H, S, Jokers"""
     if isinstance(oc, Card):
-      if self.suit == oc.suit:
-        return self.ranks.index(self.rank) >= self.ranks.index(oc.rank)
-      else:
-        return self.suits.index(self.suit) >= self.suits.index(oc.suit)
+      return self.ordinal >= oc.ordinal
     else:
       raise Exception("Other card is not a card...")
 
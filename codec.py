@@ -0,0 +1,125 @@
+"""
+bulk versions of the per-letter steps in sea.py
+
+clean, pad, letters2numbers, numbers2letters, add, subtract and fives
+give exactly the same results as the sea.py functions of the same
+name, but work on the whole string/list at once: bytes.translate for
+cleaning, NumPy (if it's installed) for the mod 26 arithmetic, and one
+join for the groups of 5. addLetters/subtractLetters skip the lists of
+numbers altogether and combine message and keystream strings directly:
+
+  ciphertext = addLetters(pad(clean(msg)), keystream)
+
+Anything NumPy can't do exactly (non-ASCII text, numbers outside 1-26)
+goes through plain Python loops instead. NumPy is only imported the
+first time a string/list big enough to use it comes along, so short
+runs don't pay for loading it.
+"""
+
+numpy = False     # not imported yet (None once we know it isn't installed)
+
+UPPERCASE = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+LOWERCASE = UPPERCASE.lower()
+# bytes.translate tables: lowercase -> uppercase, delete everything else
+TOUPPER = bytes.maketrans(LOWERCASE.encode(), UPPERCASE.encode())
+NONLETTERS = bytes([b for b in range(256) if not chr(b).isalpha() or b > 127])
+# pure Python tables for combining letters: ADD["C"]["B"] = "E" etc
+ADD = dict((m, dict((k, UPPERCASE[(i+j+1)%26]) for j, k in enumerate(UPPERCASE)))
+           for i, m in enumerate(UPPERCASE))
+SUBTRACT = dict((m, dict((k, UPPERCASE[(i-j-1)%26]) for j, k in enumerate(UPPERCASE)))
+                for i, m in enumerate(UPPERCASE))
+BIG = 64      # below this many letters, NumPy isn't worth the set up
+
+def _numpy():
+  """NumPy, imported the first time it's wanted (None if not installed)"""
+  global numpy
+  if numpy is False:
+    try:
+      import numpy
+    except ImportError:
+      numpy = None
+  return numpy
+
+def clean(orig):
+  """given a string, clean it up (only uppercase letters)"""
+  if orig.isascii():
+    return orig.encode().translate(TOUPPER, NONLETTERS).decode()
+  return "".join([ch.upper() for ch in orig if ch.isalpha()])
+
+def pad(orig):
+  """given a string, pad it with X's so multiple of 5"""
+  return orig + "X" * ((5 - len(orig)%5) % 5)
+
+def fives(S):
+  """given string S, return letters in groups of 5: ABCDE FGHIJ KLM.."""
+  return " ".join([S[i:i+5] for i in range(0, len(S), 5)])
+
+def _isUpper(s):
+  """True if s is all A-Z (so the fast paths give the same results)"""
+  return s.isascii() and (s.isupper() and s.isalpha() or s == "")
+
+def letters2numbers(s):
+  """given a string of uppercase letters, convert to numbers 1 to 26"""
+  if len(s) >= BIG and _numpy() != None and s.isascii():
+    return (numpy.frombuffer(s.encode(), numpy.uint8).astype(numpy.int64) - 64).tolist()
+  return [ord(ch) - 64 for ch in s]
+
+def numbers2letters(nums):
+  """given a list of numbers 1 to 26, convert to uppercase letters"""
+  if len(nums) >= BIG and _numpy() != None:
+    a = numpy.asarray(nums)
+    if a.dtype.kind in "iu" and a.min() >= 1 and a.max() <= 26:
+      return (a.astype(numpy.uint8) + 64).tobytes().decode()
+  return "".join([chr(n-1+ord("A")) for n in nums])
+
+def add(L1, L2):
+  """add two lists of integers (1-26), mod 26"""
+  if len(L1) >= BIG and _numpy() != None:
+    total = numpy.asarray(L1) + numpy.asarray(L2[:len(L1)])
+    return numpy.where(total > 26, total - 26, total).tolist()
+  return [a+b-26 if a+b > 26 else a+b for a, b in zip(L1, L2[:len(L1)])]
+
+def subtract(L1, L2):
+  """subtract (L1-L2) two lists of integers (1-26), mod 26"""
+  if len(L1) >= BIG and _numpy() != None:
+    diff = numpy.asarray(L1) - numpy.asarray(L2[:len(L1)])
+    return numpy.where(diff < 1, diff + 26, diff).tolist()
+  return [a-b+26 if a-b < 1 else a-b for a, b in zip(L1, L2[:len(L1)])]
+
+def _combine(msg, keystream, sign, table):
+  """add (sign=1) or subtract (sign=-1) keystream letters from msg"""
+  keystream = keystream[:len(msg)]
+  if len(keystream) < len(msg):
+    raise Exception("keystream shorter than message...")
+  if not (_isUpper(msg) and _isUpper(keystream)):
+    nums = letters2numbers(msg)
+    knums = letters2numbers(keystream)
+    if sign > 0:
+      return numbers2letters(add(nums, knums))
+    return numbers2letters(subtract(nums, knums))
+  if len(msg) >= BIG and _numpy() != None:
+    m = numpy.frombuffer(msg.encode(), numpy.uint8).astype(numpy.int16)
+    k = numpy.frombuffer(keystream.encode(), numpy.uint8).astype(numpy.int16)
+    out = (m - 65 + sign*(k - 64)) % 26 + 65
+    return out.astype(numpy.uint8).tobytes().decode()
+  return "".join([table[a][b] for a, b in zip(msg, keystream)])
+
+def addLetters(msg, keystream):
+  """encrypt: add keystream letters to message letters (A=1..Z=26)"""
+  return _combine(msg, keystream, 1, ADD)
+
+def subtractLetters(msg, keystream):
+  """decrypt: subtract keystream letters from message letters"""
+  return _combine(msg, keystream, -1, SUBTRACT)
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  msg = pad(clean("We love computer science!!!"))
+  print(msg)
+  print(fives(addLetters(msg, "B"*len(msg))))
+  print(fives(subtractLetters(addLetters(msg, "B"*len(msg)), "B"*len(msg))))
+
+if __name__ == "__main__":
+  main()
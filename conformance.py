@@ -0,0 +1,244 @@
+#! /usr/bin/python3
+
+"""
+differential checks: every keystream engine against the Card/Deck one
+
+The Card/Deck generateKeystream is the reference (the oracle). Each
+engine is given the same deck order and asked for the same number of
+letters; the letters (and the deck order after them, where the engine
+can tell us) have to match the oracle's exactly.
+
+The decks are the awkward ones first -- jokers on top, on the bottom,
+next to each other, the big joker wrapping around the bottom in
+moveDown1, bottom cards that make the biggest and smallest count cuts
+-- then randomly shuffled ones until the time budget runs out. A
+failing deck is shrunk: cards are put back in their default order one
+at a time for as long as it still fails, and the offset cut down to
+the first letter that differs, so the report shows a small case.
+
+  ./conformance.py --budget 30 --letters 500
+  ./conformance.py --engine fastdeck --engine kscache --seed 3
+"""
+
+from sea import *
+from stats import Stats
+from ksindex import IndexedKeystream
+from kscache import KeystreamCache
+try:
+  import lockstep
+except ImportError:
+  lockstep = None     # no NumPy, so no KeystreamBatch to check
+import random
+import click
+import time
+
+@click.command()
+@click.option('--budget',default=5.0,help="seconds to spend (after the fixed cases)")
+@click.option('--letters',default=200,help="keystream letters per deck")
+@click.option('--seed',default=0,help="seed for the random decks")
+@click.option('--engine','names',multiple=True,
+              help="engine(s) to check (default: all of them)")
+def main(budget,letters,seed,names):
+  """check the keystream engines against the Card/Deck path"""
+  if len(names) == 0:
+    names = list(ENGINES)
+  for name in names:
+    if name not in ENGINES:
+      raise click.UsageError("no engine %s (there's %s)" % (name, ", ".join(ENGINES)))
+  report = run(dict((name, ENGINES[name]) for name in names), budget, letters, seed)
+  print("%d decks, %d letters each, %.1f secs" % (report["decks"], letters,
+                                                 report["secs"]))
+  for name in names:
+    failure = report["failures"].get(name)
+    if failure == None:
+      print("%-16s ok" % (name))
+    else:
+      print("%-16s FAILED %s" % (name, formatFailure(failure)))
+  if len(report["failures"]) > 0:
+    raise SystemExit(1)
+
+# ------------------------------------------------- #
+# each engine takes a deck order and a letter count, and returns the
+# letters and the deck order after them (None if it can't say)
+
+def oracle(order, n):
+  """the reference: Card/Deck generateKeystream"""
+  d = Deck(order)
+  return generateKeystream(d, n), d.getOrder()
+
+def deckFast(order, n):
+  """generateKeystream with fast=True on a Deck"""
+  d = Deck(order)
+  return generateKeystream(d, n, True), d.getOrder()
+
+def fastDeck(order, n):
+  """FastDeck.generateKeystream (the fused step)"""
+  fd = FastDeck(order)
+  return fd.generateKeystream(n), fd.getOrder()
+
+def fastSteps(order, n):
+  """FastDeck's separate moveJokers/tripleCut/countCut/outputCard"""
+  fd = FastDeck(order)
+  return timedKeystream(fd, n, True, Stats()), fd.getOrder()
+
+def deckSteps(order, n):
+  """the Deck steps as --stats runs them"""
+  d = Deck(order)
+  return timedKeystream(d, n, False, Stats()), d.getOrder()
+
+def keystreamIter(order, n):
+  """Keystream, one letter at a time"""
+  ks = Keystream(FastDeck(order))
+  return "".join([next(ks) for i in range(n)]), ks.getOrder()
+
+def indexed(order, n):
+  """IndexedKeystream, with snapshots every 7 letters"""
+  ks = IndexedKeystream(FastDeck(order), 7)
+  return ks.take(n), ks.getOrder()
+
+def cached(order, n):
+  """KeystreamCache, asked for part first and then extended"""
+  cache = KeystreamCache()
+  cache.keystream(order, n//2)
+  return cache.keystream(order, n), None
+
+def streamed(order, n):
+  """the --stream keystream generator"""
+  return "".join(islice(keystreamLetters(Deck(order)), n)), None
+
+def lockstepped(order, n):
+  """KeystreamBatch, next to a deck that stops halfway"""
+  ksb = lockstep.KeystreamBatch([FastDeck(), FastDeck(order)])
+  letters = ksb.generateKeystreams([n//2, n])[1]
+  return letters, ksb.getDecks()[1].getOrder()
+
+ENGINES = {"deckFast": deckFast, "fastdeck": fastDeck, "fastSteps": fastSteps,
+           "deckSteps": deckSteps, "keystream": keystreamIter,
+           "indexed": indexed, "kscache": cached, "stream": streamed}
+if lockstep != None:
+  ENGINES["lockstep"] = lockstepped
+
+# ------------------------------------------------- #
+
+def placeJokers(order, lj, bj, last=None):
+  """order with the jokers moved to positions lj and bj (and card last
+  moved to the bottom, if given and it's not a joker spot)"""
+  cards = [order[i:i+2] for i in range(0, 108, 2) if order[i:i+2] not in ["LJ", "BJ"]]
+  if last != None and 53 not in [lj, bj]:
+    cards.remove(last)
+    cards.append(last)
+  for pos, joker in sorted([(lj, "LJ"), (bj, "BJ")]):
+    cards.insert(pos, joker)
+  return "".join(cards)
+
+def adversarialOrders(rng):
+  """decks with the jokers (and bottom card) in the awkward places"""
+  spots = [(0, 30), (30, 0), (53, 30), (30, 53), (0, 1), (1, 0), (52, 53),
+           (53, 52), (20, 21), (21, 20), (0, 53), (53, 0), (30, 52),
+           (52, 30), (51, 52), (53, 51), (1, 53), (2, 52)]
+  orders = [Deck().getOrder()]
+  for lj, bj in spots:
+    for last in [None, "KS", "AC", "KD"]:
+      d = Deck()
+      d.shuffle(rng)
+      orders.append(placeJokers(d.getOrder(), lj, bj, last))
+  return orders
+
+def randomOrder(rng):
+  """a randomly shuffled deck order"""
+  d = Deck()
+  d.shuffle(rng)
+  return d.getOrder()
+
+def firstDifference(engine, order, n, reference=None):
+  """
+  None if engine matches the oracle on order for n letters, else the
+  offset of the first letter that differs (n if only the final deck
+  order does). An engine that raises an exception fails at offset 0.
+  reference is oracle(order, n), if it's already been worked out.
+  """
+  if reference == None:
+    reference = oracle(order, n)
+  expected, expectedorder = reference
+  try:
+    letters, finalorder = engine(order, n)
+  except Exception:
+    return 0
+  for i in range(n):
+    if i >= len(letters) or letters[i] != expected[i]:
+      return i
+  if len(letters) != n or (finalorder != None and finalorder != expectedorder):
+    return n
+  return None
+
+def shrink(engine, order, n):
+  """
+  make a failing (order, n) smaller: put cards back in default order
+  while it still fails, then cut n down to just past the first
+  difference. Returns dict describing the small case.
+  """
+  target = [Deck().getOrder()[i:i+2] for i in range(0, 108, 2)]
+  cards = [order[i:i+2] for i in range(0, 108, 2)]
+  n = min(firstDifference(engine, order, n) + 1, n)
+  changed = True
+  while changed:
+    changed = False
+    for i in range(54):
+      if cards[i] == target[i]:
+        continue
+      j = cards.index(target[i])
+      trial = list(cards)
+      trial[i], trial[j] = trial[j], trial[i]
+      diff = firstDifference(engine, "".join(trial), n)
+      if diff != None:
+        cards = trial
+        n = min(diff + 1, n)
+        changed = True
+  order = "".join(cards)
+  expected, expectedorder = oracle(order, n)
+  try:
+    got = engine(order, n)[0]
+  except Exception as e:
+    got = "exception: %s" % (e)
+  return {"order": order, "letters": n, "expected": expected, "got": got,
+          "misplaced": sum([cards[i] != target[i] for i in range(54)])}
+
+def run(engines, budget=5.0, n=200, seed=0):
+  """
+  check engines (dict of name -> engine) on the adversarial decks, then
+  random ones for budget seconds. Each engine stops at its first
+  failure, which is shrunk. Returns dict with decks, secs, failures.
+  """
+  rng = random.Random(seed)
+  failures = {}
+  start = time.time()
+  decks = 0
+  orders = adversarialOrders(rng)
+  while True:
+    if len(orders) > 0:
+      order = orders.pop(0)
+    elif time.time() - start < budget:
+      order = randomOrder(rng)
+    else:
+      break
+    reference = oracle(order, n)
+    for name in engines:
+      if name in failures:
+        continue
+      if firstDifference(engines[name], order, n, reference) != None:
+        failures[name] = shrink(engines[name], order, n)
+    decks += 1
+    if len(failures) == len(engines):
+      break
+  return {"decks": decks, "secs": time.time() - start, "failures": failures}
+
+def formatFailure(failure):
+  """one line describing a shrunk failure"""
+  return "at letter %d from %s (%d cards moved): expected %s, got %s" % (
+         failure["letters"]-1, failure["order"], failure["misplaced"],
+         failure["expected"][-10:], failure["got"][-10:])
+
+# --------------------------------------- #
+
+if __name__ == "__main__":
+  main()
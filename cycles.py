@@ -0,0 +1,175 @@
+#! /usr/bin/python3
+
+"""
+find how long a key deck's keystream goes before the deck order repeats
+
+Each state is the 54-byte deck order (FastDeck codes), and one step is
+one round of the solitaire algorithm (joker moves, triple cut, count
+cut -- including the rounds whose output card is a joker). Brent's
+cycle detection finds the period (length of the cycle) and the tail
+(steps before the cycle starts) using just two saved states.
+
+Real periods are very long, so each run has a step budget; a run that
+uses it up reports a lower bound instead. Long runs can save a
+checkpoint every so often and pick up from it next time.
+
+  ./cycles.py keyfile inorder --budget 10000000
+  ./cycles.py --random 8 --seed 1 --jobs 4 --checkpoint-dir ckpts
+"""
+
+from sea import *
+from concurrent.futures import ProcessPoolExecutor
+import random
+import click
+import json
+import time
+import os
+
+@click.command()
+@click.argument('keyfiles', nargs=-1)
+@click.option('--random','nrandom',default=0,
+              help="also check this many randomly shuffled decks")
+@click.option('--seed',default=0,help="random seed for --random decks")
+@click.option('--budget',default=10**7,help="most steps to run per deck")
+@click.option('--every',default=10**6,
+              help="report progress (and checkpoint) every this many steps")
+@click.option('--checkpoint-dir',default='',
+              help="save/resume each deck's progress in this directory")
+@click.option('-j','--jobs',default=0,
+              help="number of worker processes (default: one per core)")
+def main(keyfiles,nrandom,seed,budget,every,checkpoint_dir,jobs):
+  """run cycle detection on each deck, in parallel, and report"""
+  decks = []
+  for fn in keyfiles:
+    decks.append((fn, FastDeck(readCards(fn).getOrder()).toBytes()))
+  rng = random.Random(seed)
+  for i in range(nrandom):
+    perm = list(range(54))
+    rng.shuffle(perm)
+    decks.append(("random%d" % (i), bytes(perm)))
+  if len(decks) == 0:
+    raise click.UsageError("give some keyfiles and/or --random N")
+  if jobs < 1:
+    jobs = os.cpu_count() or 1
+  args = [(name, state, budget, every, checkpoint_dir) for name, state in decks]
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    for result in pool.map(analyze, args):
+      print(formatResult(result))
+
+# ------------------------------------------------- #
+
+def deckStep(state):
+  """the next state after one round of the algorithm on state (bytes)"""
+  fd = FastDeck.__new__(FastDeck)
+  fd.perm = bytearray(state)
+  fd.step()
+  return bytes(fd.perm)
+
+def brent(f, start, budget, every=0, progress=None, resume=None):
+  """
+  Brent's cycle detection on x, f(x), f(f(x)), ... from start. Returns
+  dict with found, period, tail and steps (calls to f). If budget steps
+  go by first, found is False and period+tail is at least steps/2.
+  Every 'every' steps progress(dict) is called with the search state,
+  which can be given back as resume to carry on from there.
+  """
+  if resume != None:
+    steps = resume["steps"]
+    power = resume["power"]
+    lam = resume["lam"]
+    tortoise = resume["tortoise"]
+    hare = resume["hare"]
+  else:
+    steps = 1
+    power = 1
+    lam = 1
+    tortoise = start
+    hare = f(start)
+  # find the period: tortoise waits at powers of two for hare to lap it
+  while tortoise != hare:
+    if steps >= budget:
+      return {"found": False, "period": None, "tail": None, "steps": steps}
+    if power == lam:
+      tortoise = hare
+      power *= 2
+      lam = 0
+    hare = f(hare)
+    lam += 1
+    steps += 1
+    if every > 0 and steps % every == 0 and progress != None:
+      progress({"steps": steps, "power": power, "lam": lam,
+                "tortoise": tortoise, "hare": hare})
+  # find the tail: start one pointer period steps ahead, walk together
+  tortoise = start
+  hare = start
+  for i in range(lam):
+    hare = f(hare)
+  steps += lam
+  mu = 0
+  while tortoise != hare:
+    tortoise = f(tortoise)
+    hare = f(hare)
+    mu += 1
+    steps += 2
+  return {"found": True, "period": lam, "tail": mu, "steps": steps}
+
+def analyze(args):
+  """run brent on one deck (in a worker), with timing and checkpoints"""
+  name, state, budget, every, checkpoint_dir = args
+  resume = None
+  ckfn = None
+  if checkpoint_dir != '':
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    ckfn = os.path.join(checkpoint_dir, state.hex() + ".json")
+    resume = loadCheckpoint(ckfn)
+  startsteps = 0
+  if resume != None:
+    startsteps = resume["steps"]
+  start = time.time()
+  def progress(search):
+    secs = time.time() - start
+    rate = (search["steps"] - startsteps)/max(secs, 1e-9)
+    print("%s: %d steps (%d states/sec)" % (name, search["steps"], rate), flush=True)
+    if ckfn != None:
+      saveCheckpoint(ckfn, search)
+  result = brent(deckStep, state, budget, every, progress, resume)
+  secs = time.time() - start
+  result["name"] = name
+  result["secs"] = secs
+  result["rate"] = (result["steps"] - startsteps)/max(secs, 1e-9)
+  return result
+
+def saveCheckpoint(fn, search):
+  """write brent's search state to fn (deck states as hex)"""
+  tmp = fn + ".tmp"
+  ofile = open(tmp, "w")
+  json.dump({"steps": search["steps"], "power": search["power"],
+             "lam": search["lam"], "tortoise": search["tortoise"].hex(),
+             "hare": search["hare"].hex()}, ofile)
+  ofile.close()
+  os.replace(tmp, fn)
+
+def loadCheckpoint(fn):
+  """read a checkpoint written by saveCheckpoint, or None if there isn't one"""
+  if not os.path.exists(fn):
+    return None
+  inf = open(fn, "r")
+  search = json.load(inf)
+  inf.close()
+  search["tortoise"] = bytes.fromhex(search["tortoise"])
+  search["hare"] = bytes.fromhex(search["hare"])
+  return search
+
+def formatResult(result):
+  """one line of report for one deck"""
+  if result["found"]:
+    found = "period %d, tail %d" % (result["period"], result["tail"])
+  else:
+    found = "no repeat within %d steps" % (result["steps"])
+  return "%s: %s (%d steps, %.1f secs, %d states/sec)" % (result["name"],
+         found, result["steps"], result["secs"], result["rate"])
+
+# --------------------------------------- #
+
+if __name__ == "__main__":
+  main()
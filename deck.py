@@ -16,12 +16,21 @@ Spring 2019
 from card import *
 from random import shuffle
 
+# every card by its two-letter string, for parsing order strings quickly
+CARDTABLE = {}
+for suit in "CDHS":
+  for rank in "A23456789TJQK":
+    CARDTABLE[rank+suit] = Card(rank,suit)
+CARDTABLE["LJ"] = Card("L","J")
+CARDTABLE["BJ"] = Card("B","J")
+FULLDECK = (1 << 54) - 1    # bitmask with one bit set per card ordinal
+
 class Deck(object):
   """deck of 52 playing cards plus 2 jokers"""
 
   def __init__(self, order=""):
     """create all 54 cards (use specified order if given)"""
-    self.cards = []
+    self._cards = []
     if order == "":
       for suit in "CDHS":
         for rank in "A23456789TJQK":
@@ -40,6 +49,84 @@ class Deck(object):
         suit = order[i+1]
         c = Card(rank,suit)
         self.cards.append(c)
+    self._reindex()
+
+  @classmethod
+  def fromOrder(cls, order):
+    """
+    make a full deck from a 108-char order string (as in keyfiles),
+    checking it has each of the 54 cards exactly once. Much faster than
+    Deck(order), and the error says which card is repeated or missing.
+    """
+    if len(order) != 54*2:
+      raise Exception("Order has %d characters, needs 108 (54 cards)..." %
+                      (len(order)))
+    order = order.upper()
+    cards = []
+    positions = {}
+    seen = 0
+    for i in range(0, 108, 2):
+      cstr = order[i:i+2]
+      if cstr not in CARDTABLE:
+        raise Exception("Odd card (%s) at position %d..." % (cstr, i//2))
+      card = CARDTABLE[cstr]
+      bit = 1 << card.ordinal
+      if seen & bit:
+        raise Exception("Card (%s) is in the deck twice..." % (cstr))
+      seen |= bit
+      positions[cstr] = i//2
+      cards.append(card)
+    # 54 cards with no repeats means none can be missing, but be sure
+    if seen != FULLDECK:
+      missing = [c for c in CARDTABLE if not seen & (1 << CARDTABLE[c].ordinal)]
+      raise Exception("Card(s) %s missing from the deck..." % (",".join(missing)))
+    d = cls.__new__(cls)
+    d._cards = cards
+    d._setIndex(positions)
+    return d
+
+  def _reindex(self):
+    """
+    rebuild the card->position index (first one wins if a partial
+    deck has repeats), so getIndex and findJokers don't have to search
+    """
+    positions = {}
+    for i in range(len(self._cards)-1, -1, -1):
+      c = self._cards[i]
+      positions[c.rank + c.suit] = i
+    self._setIndex(positions)
+
+  def _setIndex(self, positions):
+    """use positions (card string -> index) as the position index"""
+    self.positions = positions
+    self._jokers = {"LJ": positions.get("LJ"), "BJ": positions.get("BJ")}
+    self._unique = len(positions) == len(self._cards)
+    self._stale = False
+
+  def _cut(self, cards, newpos):
+    """
+    replace the cards after a cut/move. The jokers are tracked right
+    away using newpos(oldindex); the rest of the index is rebuilt the
+    next time someone asks for a non-joker card.
+    """
+    self._cards = cards
+    if self._unique:
+      for j in self._jokers:
+        if self._jokers[j] != None:
+          self._jokers[j] = newpos(self._jokers[j])
+      self._stale = True
+    else:
+      self._reindex()
+
+  def _getCards(self):
+    return self._cards
+
+  def _setCards(self, cards):
+    self._cards = cards
+    self._reindex()
+
+  # assigning a new list to d.cards keeps the position index up to date
+  cards = property(_getCards, _setCards)
 
   def __len__(self): 
     return len(self.cards)
@@ -70,14 +157,26 @@ class Deck(object):
       s.append(rank + suit)
     return "".join(s)
 
-  def shuffle(self):
-    """shuffle the deck using random lib shuffle"""
-    shuffle(self.cards) 
+  def shuffle(self, rng=None):
+    """
+    shuffle the deck using random lib shuffle (or rng.shuffle, if given
+    a random.Random, for a repeatable shuffle)
+    """
+    if rng == None:
+      shuffle(self._cards)
+    else:
+      rng.shuffle(self._cards)
+    self._reindex()
 
   def dealCard(self):
     """deal one card from the deck"""
     if len(self.cards) > 0:
-      card = self.cards.pop(0) 
+      card = self._cards.pop(0)
+      key = card.rank + card.suit
+      if self._unique and key in self._jokers:
+        self._jokers[key] = None
+      # everything moves up one; rebuild the rest of the index lazily
+      self._cut(self._cards, lambda p: p - 1)
       return card
     else:
       raise Exception("Tried to deal from empty deck...")
@@ -91,12 +190,13 @@ class Deck(object):
     given a card string, such as "AS", or "3C", return it's 
     index in the deck (0=first, 1=second,...)
     """
-    rank=cardstr[0].upper()
-    suit=cardstr[1].upper()
-    for i in range(len(self.cards)):
-      c = self.cards[i]
-      if c.getRank()==rank and c.getSuit()==suit:
-        return i
+    key=cardstr[0].upper() + cardstr[1].upper()
+    if key in self._jokers and self._jokers[key] != None:
+      return self._jokers[key]
+    if self._stale:
+      self._reindex()
+    if key in self.positions:
+      return self.positions[key]
     raise Exception("Card (%s) not found in deck..." % cardstr)
 
   def moveDown1(self, i):
@@ -104,13 +204,24 @@ class Deck(object):
     move the card at index i down by 1.
     however, if card is last, don't swap with first. move it to second spot.
     """
-    if i == len(self.cards)-1:
+    cards = self._cards
+    if i == len(cards)-1:
       # insert into position 1
-      lastcard = self.cards.pop()
-      self.cards.insert(1,lastcard)
+      lastcard = cards.pop()
+      cards.insert(1,lastcard)
+      self._cut(cards, lambda p: 1 if p == i else (p+1 if p > 0 else p))
     else:
       # just swap with next card
-      self.cards[i],self.cards[i+1] = self.cards[i+1],self.cards[i]
+      cards[i],cards[i+1] = cards[i+1],cards[i]
+      if not self._unique:
+        self._reindex()
+        return
+      for j in (i, i+1):
+        key = cards[j].rank + cards[j].suit
+        if key in self._jokers:
+          self._jokers[key] = j
+        if not self._stale:
+          self.positions[key] = j
 
   def findJokers(self):
     """
@@ -118,10 +229,17 @@ class Deck(object):
     Doesn't matter which joker is which, just return index of 
     first joker found and index of second joker found
     """
+    if self._unique:
+      first = self._jokers["LJ"]
+      second = self._jokers["BJ"]
+      if first==None or second==None:
+        raise Exception("There aren't two jokers in this deck...")
+      if first > second:
+        first, second = second, first
+      return first, second
     first = None
     second = None
     for i in range(len(self.cards)):
-      rank = self.cards[i].getRank()
       suit = self.cards[i].getSuit()
       if suit=="J":
         if first==None:
@@ -142,9 +260,15 @@ class Deck(object):
     before = self.cards[:first]
     after = self.cards[second+1:]
     middle = self.cards[first:second+1]
-    self.cards = after + middle + before
+    na = len(after)
+    nm = len(middle)
+    def newpos(p):
+      if p > second: return p - (second+1)
+      if p >= first: return p - first + na
+      return p + na + nm
+    self._cut(after + middle + before, newpos)
 
-  def countCut(self):
+  def countCut(self, count=None):
     """
     count cut the deck: find *number* of last card, count down that
     many from the top, swap top cut with rest of the deck, leaving the
@@ -155,13 +279,21 @@ class Deck(object):
     If last card is 5H, would count down 5+26
     If last card is 5S, would count down 5+39
     If last card is a joker, do nothing.
+    If count is given (as when keying the deck from a passphrase), cut
+    that many cards instead, whatever the last card is.
     """
     last = self.cards[len(self.cards) - 1]
-    if last.getSuit() != "J":   # do nothing if joker
-      count = last.rankNum() + (last.suitNum()*13)
+    if count != None or last.getSuit() != "J":   # do nothing if joker
+      if count == None:
+        count = last.value
       before = self.cards[:count]
       after = self.cards[count:len(self.cards)-1]
-      self.cards = after + before + [last]
+      nlast = len(self.cards) - 1
+      def newpos(p):
+        if p == nlast: return p
+        if p >= count: return p - count
+        return p + len(after)
+      self._cut(after + before + [last], newpos)
 
   def outputCard(self):
     """
@@ -169,12 +301,7 @@ class Deck(object):
     output the card. So if top card is 5C, count down 5 from the top
     (first card is 1), then output the next card.
     """
-    topcard = self.cards[0]
-    suit = topcard.getSuit()
-    if suit == "J":
-      topnum = 53     # either joker is 53
-    else:
-      topnum = topcard.rankNum() + (topcard.suitNum()*13)
+    topnum = self.cards[0].value    # either joker is 53
     outcard = self.cards[topnum]
     suit = outcard.getSuit()
     if suit == "J":
@@ -184,26 +311,12 @@ class Deck(object):
 
   def _valid(self):
     """return True if deck has all 54 cards and no repeats"""
-    if len(self.cards) < 54:
-      return False
-    dcp = list(self.cards)  # deck copy
-    dcp.sort()              # should now be sorted
-    ranks = list("A23456789TJQK")
-    suits = list("CDHS")
-    i = 0
-    for s in suits:
-      for r in ranks:
-        c = dcp[i]
-        if c.getRank()!=r or c.getSuit()!=s:
-          return False
-        i += 1
-    if dcp[i].getRank()!="B" or dcp[i].getSuit()!= "J":
-      return False
-    i += 1
-    if dcp[i].getRank()!="L" or dcp[i].getSuit()!= "J":
+    if len(self._cards) != 54:
       return False
-    # if we get here...all OK
-    return True
+    seen = 0
+    for card in self._cards:
+      seen |= 1 << card.ordinal
+    return seen == FULLDECK
 
 # ---------------------------------------------- #
 
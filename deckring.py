@@ -0,0 +1,229 @@
+#! /usr/bin/python3
+
+"""
+keyring file: lots of key decks in one compact binary file
+
+Layout (all big-endian):
+  header   8-byte magic "SOLRING1", 4-byte key count, 2-byte ID size,
+           2 bytes unused
+  records  one per key, sorted by ID: the ID (utf-8, padded with
+           NULs to the ID size) then 54 bytes of FastDeck card codes
+
+Records are fixed size and sorted, so a key is found by binary search
+right in the file. The file is opened with mmap, so looking up one key
+only reads the few pages the search touches.
+
+  ./deckring.py import keys.ring keyfile datafiles/inorder
+  ./deckring.py list keys.ring
+  ./deckring.py export keys.ring keyfile -d outdir
+  ./sea.py --keyring keys.ring --key-id keyfile -m datafiles/cs
+"""
+
+from deck import *
+from fastdeck import FastDeck, CARDSTRS
+import struct
+import click
+import mmap
+import os
+
+MAGIC = b"SOLRING1"
+HEADER = struct.Struct(">8sIHH")
+IDSIZE = 32
+
+class Keyring(object):
+  """read-only view of a keyring file"""
+
+  def __init__(self, fn):
+    self.inf = open(fn, "rb")
+    self.mm = None
+    try:
+      self._open(fn)
+    except Exception:
+      self.close()
+      raise
+
+  def _open(self, fn):
+    """map the file and check its header"""
+    if os.fstat(self.inf.fileno()).st_size < HEADER.size:
+      raise Exception("Keyring (%s) is too short..." % (fn))
+    self.mm = mmap.mmap(self.inf.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(self.mm) < HEADER.size:
+      raise Exception("Keyring (%s) is too short..." % (fn))
+    magic, self.count, self.idsize, unused = HEADER.unpack_from(self.mm, 0)
+    if magic != MAGIC:
+      raise Exception("Keyring (%s) isn't a keyring file..." % (fn))
+    self.recsize = self.idsize + 54
+    if len(self.mm) != HEADER.size + self.count*self.recsize:
+      raise Exception("Keyring (%s) is the wrong size..." % (fn))
+
+  def __len__(self):
+    return self.count
+
+  def __contains__(self, keyid):
+    return self._find(keyid) != None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+    return False
+
+  def close(self):
+    """done with the keyring"""
+    if self.mm != None:
+      self.mm.close()
+    self.inf.close()
+
+  def _id(self, i):
+    """the (padded) ID bytes of record i"""
+    start = HEADER.size + i*self.recsize
+    return self.mm[start:start+self.idsize]
+
+  def _find(self, keyid):
+    """binary search for keyid, return its record number or None"""
+    target = encodeId(keyid, self.idsize)
+    lo = 0
+    hi = self.count
+    while lo < hi:
+      mid = (lo + hi)//2
+      if self._id(mid) < target:
+        lo = mid + 1
+      else:
+        hi = mid
+    if lo < self.count and self._id(lo) == target:
+      return lo
+    return None
+
+  def ids(self):
+    """all the key IDs, in sorted order"""
+    for i in range(self.count):
+      yield self._id(i).rstrip(b"\0").decode()
+
+  def getPerm(self, keyid):
+    """the 54 card codes (bytes) of key keyid"""
+    i = self._find(keyid)
+    if i == None:
+      raise Exception("Key (%s) not in keyring..." % (keyid))
+    start = HEADER.size + i*self.recsize + self.idsize
+    return self.mm[start:start+54]
+
+  def getOrder(self, keyid):
+    """the 108-char deck order of key keyid"""
+    return "".join([CARDSTRS[code] for code in self.getPerm(keyid)])
+
+  def getDeck(self, keyid):
+    """a (validated) Deck for key keyid"""
+    return Deck.fromOrder(self.getOrder(keyid))
+
+def checkId(keyid):
+  """
+  make sure key ID is safe to use as a file name in an export
+  directory: no path separators, no "..", not an absolute path
+  """
+  if "/" in keyid or "\\" in keyid or ".." in keyid or os.path.isabs(keyid):
+    raise Exception("Key ID (%s) can't have /, \\ or .. in it..." % (keyid))
+
+def encodeId(keyid, idsize=IDSIZE):
+  """key ID as NUL-padded bytes, checking it fits"""
+  raw = keyid.encode()
+  if len(raw) == 0 or len(raw) > idsize or b"\0" in raw:
+    raise Exception("Key ID (%s) must be 1-%d bytes, no NULs..." % (keyid, idsize))
+  return raw + b"\0"*(idsize - len(raw))
+
+def writeKeyring(fn, keys, idsize=IDSIZE):
+  """
+  write keys (list of (ID, deck order or 54 card codes)) to keyring
+  file fn. Every deck is checked, and IDs must be unique.
+  """
+  records = []
+  for keyid, deck in keys:
+    if isinstance(deck, str):
+      deck = FastDeck(Deck.fromOrder(deck).getOrder()).toBytes()
+    checkId(keyid)
+    records.append((encodeId(keyid, idsize), FastDeck.fromBytes(deck).toBytes()))
+  records.sort()
+  for i in range(1, len(records)):
+    if records[i][0] == records[i-1][0]:
+      raise Exception("Key ID (%s) is in the keyring twice..." %
+                      (records[i][0].rstrip(b"\0").decode()))
+  tmp = fn + ".tmp"
+  ofile = open(tmp, "wb")
+  ofile.write(HEADER.pack(MAGIC, len(records), idsize, 0))
+  for rawid, perm in records:
+    ofile.write(rawid)
+    ofile.write(perm)
+  ofile.close()
+  os.replace(tmp, fn)
+
+def readKeyfile(fn):
+  """deck order from a keyfile (first non-comment line), checked"""
+  inf = open(fn, "r")
+  for line in inf:
+    line = line.strip()
+    if line != "" and line[0] != "#":
+      inf.close()
+      return Deck.fromOrder(line).getOrder()
+  inf.close()
+  raise Exception("Keyfile (%s) has no deck order..." % (fn))
+
+def writeKeyfile(fn, order, comment="from a keyring", overwrite=True):
+  """
+  write a deck order as a keyfile (comment line, then the order),
+  readable by its owner only. With overwrite=False, an existing file is
+  an error rather than being replaced.
+  """
+  flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if overwrite else os.O_EXCL)
+  ofile = os.fdopen(os.open(fn, flags, 0o600), "w")
+  ofile.write("# %s\n" % (comment))
+  ofile.write(order + "\n")
+  ofile.close()
+
+# ------------------------------------------------- #
+
+@click.group()
+def main():
+  """make, list and unpack keyring files"""
+
+@main.command("import")
+@click.argument('ring')
+@click.argument('keyfiles', nargs=-1, required=True)
+def importKeys(ring, keyfiles):
+  """add keyfiles to RING (ID is the file name), making it if need be"""
+  keys = {}
+  if os.path.exists(ring):
+    with Keyring(ring) as kr:
+      for keyid in kr.ids():
+        keys[keyid] = kr.getPerm(keyid)
+  for fn in keyfiles:
+    keys[os.path.basename(fn)] = readKeyfile(fn)
+  writeKeyring(ring, list(keys.items()))
+  print("%d keys in %s" % (len(keys), ring))
+
+@main.command("export")
+@click.argument('ring')
+@click.argument('ids', nargs=-1)
+@click.option('-d','--outdir',default='.',help="directory for the keyfiles")
+def exportKeys(ring, ids, outdir):
+  """write keys from RING as keyfiles named by ID (all if no IDs given)"""
+  with Keyring(ring) as kr:
+    if len(ids) == 0:
+      ids = list(kr.ids())
+    for keyid in ids:
+      checkId(keyid)
+    os.makedirs(outdir, exist_ok=True)
+    for keyid in ids:
+      writeKeyfile(os.path.join(outdir, keyid), kr.getOrder(keyid),
+                   "key %s from keyring %s" % (keyid, ring))
+  print("%d keyfiles written to %s" % (len(ids), outdir))
+
+@main.command("list")
+@click.argument('ring')
+def listKeys(ring):
+  """print the IDs in RING"""
+  with Keyring(ring) as kr:
+    for keyid in kr.ids():
+      print(keyid)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,235 @@
+"""
+fast deck of cards for generating solitaire keystream
+
+Holds the 54 cards as a bytearray of integer codes instead of a list
+of Card objects:
+  AC..KC = 0-12, AD..KD = 13-25, AH..KH = 26-38, AS..KS = 39-51,
+  LJ = 52, BJ = 53
+so the count value of a card is just code+1 (either joker counts 53),
+and the keystream letter of an output card is code%26 (A-Z).
+
+  fd = FastDeck(order)          # same 108-char order string as Deck
+  fd = FastDeck.fromDeck(d)     # or copy an existing Deck
+  ks = fd.generateKeystream(10) # same letters as sea.generateKeystream
+"""
+
+from deck import *
+
+RANKS = "A23456789TJQK"
+SUITS = "CDHS"
+LJ = 52
+BJ = 53
+CARDSTRS = [r+s for s in SUITS for r in RANKS] + ["LJ", "BJ"]
+CODES = dict((cstr, i) for i, cstr in enumerate(CARDSTRS))
+LETTERS = [chr(ord("A") + (code%26)) for code in range(52)]
+
+def passphraseLetters(passphrase):
+  """
+  the letters of a passphrase that key a deck: A-Z, uppercased, with
+  spaces/digits/punctuation left out. Other letters (like accented
+  ones) have no count, and a passphrase with no letters wouldn't key
+  the deck at all, so both are errors (which never show the passphrase)
+  """
+  letters = []
+  for ch in passphrase:
+    if ch.isalpha():
+      if not ch.isascii():
+        raise Exception("Passphrase can only use the letters A-Z...")
+      letters.append(ch.upper())
+  if len(letters) == 0:
+    raise Exception("Passphrase has no letters, it would leave the deck unkeyed...")
+  return "".join(letters)
+
+class FastDeck(object):
+  """full 54-card solitaire deck stored as an integer permutation"""
+
+  def __init__(self, order=""):
+    """create deck in default order, or from a 108-char order string"""
+    if order == "":
+      self.perm = bytearray(range(54))
+    else:
+      if len(order) != 54*2:
+        raise Exception("Order needs all 54 cards: AS2S3S...")
+      codes = []
+      for i in range(0, len(order), 2):
+        cstr = order[i:i+2].upper()
+        if cstr not in CODES:
+          raise Exception("Odd card (%s) in order..." % (cstr))
+        codes.append(CODES[cstr])
+      self.setPerm(codes)
+
+  @classmethod
+  def fromDeck(cls, d):
+    """make a FastDeck with the same order as Deck d"""
+    return cls(d.getOrder())
+
+  @classmethod
+  def fromBytes(cls, perm):
+    """make a FastDeck from 54 card codes (bytes, bytearray, list)"""
+    fd = cls.__new__(cls)
+    fd.setPerm(perm)
+    return fd
+
+  def setPerm(self, perm):
+    """set deck from 54 card codes, checking they are all there"""
+    perm = bytearray(perm)
+    if len(perm) != 54 or len(set(perm)) != 54 or max(perm) > 53:
+      raise Exception("Deck needs each of the 54 cards exactly once...")
+    self.perm = perm
+
+  def __len__(self):
+    return len(self.perm)
+
+  def __str__(self):
+    """return string representation of deck of cards"""
+    return Deck(self.getOrder()).__str__()
+
+  def __getitem__(self, index):
+    """return card string (e.g. "5D") at given index"""
+    return CARDSTRS[self.perm[index]]
+
+  def copy(self):
+    """return an independent copy of this deck"""
+    return FastDeck.fromBytes(self.perm)
+
+  def toBytes(self):
+    """return current order as 54 bytes of card codes"""
+    return bytes(self.perm)
+
+  def getOrder(self):
+    """return one long string to show current order of cards"""
+    return "".join([CARDSTRS[code] for code in self.perm])
+
+  def toDeck(self):
+    """return a regular Deck (of Card objects) in the same order"""
+    return Deck(self.getOrder())
+
+  def step(self):
+    """
+    do one round of the solitaire algorithm (move jokers, triple cut,
+    count cut, find output card). Returns the code of the output card,
+    or None if the output card was a joker. Same as calling moveJokers,
+    tripleCut, countCut and outputCard, but all in one place since
+    this is where all the time goes.
+    """
+    d = self.perm
+    # move little joker down one (from bottom it goes below top card)
+    i = d.index(LJ)
+    if i == 53:
+      del d[53]
+      d.insert(1, LJ)
+    else:
+      d[i], d[i+1] = d[i+1], d[i]
+    # move big joker down two, one at a time
+    i = d.index(BJ)
+    for j in range(2):
+      if i == 53:
+        del d[53]
+        d.insert(1, BJ)
+        i = 1
+      else:
+        d[i], d[i+1] = d[i+1], d[i]
+        i += 1
+    # triple cut around the jokers
+    first = d.index(LJ)
+    second = i
+    if first > second:
+      first, second = second, first
+    d = d[second+1:] + d[first:second+1] + d[:first]
+    # count cut using value of bottom card (joker means do nothing)
+    last = d[53]
+    if last < LJ:
+      count = last + 1
+      d = d[count:53] + d[:count] + d[53:]
+    self.perm = d
+    # output card: count down value of top card
+    top = d[0]
+    if top < LJ:
+      outcard = d[top+1]
+    else:
+      outcard = d[53]
+    if outcard < LJ:
+      return outcard
+    return None
+
+  def moveJokers(self):
+    """move little joker down one and big joker down two"""
+    d = self.perm
+    for joker, moves in [(LJ, 1), (BJ, 2)]:
+      for j in range(moves):
+        i = d.index(joker)
+        if i == 53:
+          del d[53]
+          d.insert(1, joker)
+        else:
+          d[i], d[i+1] = d[i+1], d[i]
+
+  def tripleCut(self):
+    """swap the cards above the first joker with those below the second"""
+    d = self.perm
+    first = d.index(LJ)
+    second = d.index(BJ)
+    if first > second:
+      first, second = second, first
+    self.perm = d[second+1:] + d[first:second+1] + d[:first]
+
+  def countCut(self, count=None):
+    """
+    cut count cards from the top to just above the bottom card. If no
+    count is given, use the value of the bottom card (nothing if joker)
+    """
+    d = self.perm
+    if count == None:
+      if d[53] >= LJ:
+        return
+      count = d[53] + 1
+    self.perm = d[count:53] + d[:count] + d[53:]
+
+  def outputCard(self):
+    """return code of the output card, or None if it's a joker"""
+    d = self.perm
+    outcard = d[min(d[0]+1, 53)]
+    if outcard < LJ:
+      return outcard
+    return None
+
+  def keyPassphrase(self, passphrase):
+    """
+    key the deck from a passphrase (see passphraseLetters): for each
+    letter, do one round of the algorithm (output card ignored), then a
+    count cut using the letter's value (A=1..Z=26)
+    """
+    for ch in passphraseLetters(passphrase):
+      self.step()
+      self.countCut(ord(ch) - ord("A") + 1)
+
+  def nextLetter(self):
+    """step until a non-joker output card, return its keystream letter"""
+    outcard = self.step()
+    while outcard == None:
+      outcard = self.step()
+    return LETTERS[outcard]
+
+  def generateKeystream(self, n):
+    """generate n keystream letters, return as a string"""
+    step = self.step
+    kstrm = []
+    while len(kstrm) < n:
+      outcard = step()
+      if outcard != None:
+        kstrm.append(LETTERS[outcard])
+    return "".join(kstrm)
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  fd = FastDeck()
+  print("initial deck:")
+  print(fd)
+  print("first 10 keystream letters: %s" % fd.generateKeystream(10))
+  print("deck after that:")
+  print(fd)
+
+if __name__ == "__main__":
+  main()
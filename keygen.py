@@ -0,0 +1,119 @@
+#! /usr/bin/python3
+
+"""
+make lots of random key decks at once
+
+Each deck is a Fisher-Yates shuffle driven by bytes from the OS CSPRNG
+(secrets.token_bytes), read a batch at a time instead of one system
+call per swap. A byte is only used if it's below the biggest multiple
+of the range size that fits, so every order is equally likely.
+
+The keys go into one keyring file (see deckring.py) or a directory of
+keyfiles. With --unique, the first 12 cards of every key are kept in a
+set and any key that starts the same way as one before it is thrown
+away and made again. That's a few bytes per key, so it's cheap even
+for millions of keys. With 54!/42! possible starts it should never
+happen at all, so if it keeps happening the random numbers are broken
+and it stops with an error.
+
+  ./keygen.py -n 100000 --keyring keys.ring --unique
+  ./keygen.py -n 10 --outdir keys --prefix alice
+"""
+
+from deckring import *
+import secrets
+import click
+import time
+import os
+
+BATCH = 2**16     # random bytes read from the OS at a time
+PREFIX = 12       # cards compared by the --unique check
+MAXREPEATS = 10   # repeats --unique puts up with before giving up
+# bytes at or above LIMITS[i] are thrown away when picking from 0..i
+LIMITS = [256 - 256 % (i+1) for i in range(54)]
+
+@click.command()
+@click.option('-n','--count',default=1,help="number of keys to make")
+@click.option('--keyring',default='',help="write the keys to this keyring file")
+@click.option('--outdir',default='',help="write the keys as keyfiles in this directory")
+@click.option('--prefix',default='key',help="key IDs are this plus a number")
+@click.option('--unique',is_flag=True,help="make sure no two keys are the same")
+def main(count,keyring,outdir,prefix,unique):
+  """make COUNT random keys, as a keyring or keyfiles"""
+  if (keyring=='') == (outdir==''):
+    raise click.UsageError("give one of --keyring or --outdir")
+  try:
+    checkId(prefix)
+  except Exception as e:
+    raise click.BadParameter(str(e), param_hint="--prefix")
+  start = time.time()
+  keys = generateKeys(count, prefix, unique)
+  if keyring != '':
+    if os.path.exists(keyring):
+      raise click.UsageError("keyring (%s) already exists" % (keyring))
+    writeKeyring(keyring, keys)
+  else:
+    for keyid, perm in keys:
+      if os.path.exists(os.path.join(outdir, keyid)):
+        raise click.UsageError("keyfile (%s) already exists in %s" % (keyid, outdir))
+    os.makedirs(outdir, exist_ok=True)
+    for keyid, perm in keys:
+      writeKeyfile(os.path.join(outdir, keyid), FastDeck.fromBytes(perm).getOrder(),
+                   "random key %s from keygen.py" % (keyid), overwrite=False)
+  secs = time.time() - start
+  print("%d keys in %.1f secs (%d keys/sec)" % (count, secs, count/max(secs, 1e-9)))
+
+# ------------------------------------------------- #
+
+def randomPerms(n, batch=BATCH):
+  """generator of n random decks (bytearrays of 54 FastDeck card codes)"""
+  buf = b""
+  pos = 0
+  nbuf = 0
+  limits = LIMITS
+  for k in range(n):
+    perm = bytearray(range(54))
+    i = 53
+    while i > 0:
+      if pos >= nbuf:
+        buf = secrets.token_bytes(batch)
+        nbuf = len(buf)
+        pos = 0
+      b = buf[pos]
+      pos += 1
+      if b < limits[i]:
+        j = b % (i+1)
+        perm[i], perm[j] = perm[j], perm[i]
+        i -= 1
+    yield perm
+
+def generateKeys(n, prefix="key", unique=False):
+  """
+  list of n (ID, 54 card codes) random keys, IDs numbered from 1. With
+  unique, keys that start like an earlier one are made again.
+  """
+  width = len(str(n))
+  keys = []
+  seen = set()
+  repeats = 0
+  perms = randomPerms(n)
+  while len(keys) < n:
+    perm = next(perms, None)
+    if perm == None:
+      perms = randomPerms(n - len(keys))
+      continue
+    if unique:
+      start = bytes(perm[:PREFIX])
+      if start in seen:
+        repeats += 1
+        if repeats > MAXREPEATS:
+          raise Exception("random keys keep repeating, something's wrong...")
+        continue
+      seen.add(start)
+    keys.append(("%s%0*d" % (prefix, width, len(keys)+1), bytes(perm)))
+  return keys
+
+# --------------------------------------- #
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,190 @@
+#! /usr/bin/python3
+
+"""
+known-plaintext search for a partly known key deck
+
+Give the deck order with ?? for each card position that isn't known,
+and some plaintext/ciphertext pairs (with the letter offset into the
+message each one starts at). Every way of putting the missing cards
+into the unknown positions is tried: the keystream is made one letter
+at a time and the candidate is dropped at the first letter that doesn't
+match what the pairs say it has to be.
+
+Each candidate is a copy of one template bytearray (the known cards,
+already in place) with just the unknown positions filled in, so nothing
+goes through Deck(order). The candidates are split by which cards go in
+the first unknown positions, and the pieces spread over worker
+processes.
+
+  ./keysearch.py partial.txt --pair 0 DONOTUSEPC OSKJJJGTMW -j 8
+"""
+
+from sea import *
+from fastdeck import CODES, LETTERS
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+import click
+import math
+import time
+import os
+
+@click.command()
+@click.argument('partial')
+@click.option('--pair',type=(int,str,str),multiple=True,required=True,
+              help="OFFSET PLAINTEXT CIPHERTEXT known at that letter offset")
+@click.option('-j','--jobs',default=0,
+              help="number of worker processes (default: one per core)")
+def main(partial,pair,jobs):
+  """try every completion of the PARTIAL deck (order string or file)"""
+  if os.path.exists(partial):
+    partial = readPartial(partial)
+  template, holes, missing = parsePartial(partial)
+  want = wantedKeystream(pair)
+  if jobs < 1:
+    jobs = os.cpu_count() or 1
+  total = math.factorial(len(missing))
+  print("%d unknown cards, %d candidates, checking %d keystream letters" %
+        (len(missing), total, sum([w != None for w in want])), flush=True)
+  start = time.time()
+  def progress(tested):
+    secs = time.time() - start
+    print("%d/%d tested (%.1f%%), %d candidates/sec" % (tested, total,
+          100*tested/total, tested/max(secs, 1e-9)), flush=True)
+  found = search(template, holes, missing, want, jobs, progress)
+  secs = time.time() - start
+  for perm in found:
+    print("MATCH %s" % (FastDeck.fromBytes(perm).getOrder()))
+  print("%d matches, %d candidates in %.1f secs (%d candidates/sec)" %
+        (len(found), total, secs, total/max(secs, 1e-9)))
+
+# ------------------------------------------------- #
+
+def readPartial(fn):
+  """partial deck order from a file (first non-comment line)"""
+  inf = open(fn, "r")
+  for line in inf:
+    line = line.strip()
+    if line != "" and line[0] != "#":
+      inf.close()
+      return line
+  inf.close()
+  raise Exception("file (%s) has no deck order..." % (fn))
+
+def parsePartial(order):
+  """
+  split a 108-char order with ?? for unknown cards into (template
+  bytearray, list of unknown positions, list of missing card codes)
+  """
+  if len(order) != 54*2:
+    raise Exception("partial order needs 54 cards (?? for unknown ones)...")
+  template = bytearray(54)
+  holes = []
+  known = set()
+  for i in range(54):
+    cstr = order[2*i:2*i+2].upper()
+    if cstr == "??":
+      holes.append(i)
+      continue
+    if cstr not in CODES:
+      raise Exception("Odd card (%s) in order..." % (cstr))
+    if CODES[cstr] in known:
+      raise Exception("Card (%s) is in the order twice..." % (cstr))
+    known.add(CODES[cstr])
+    template[i] = CODES[cstr]
+  missing = [code for code in range(54) if code not in known]
+  return template, holes, missing
+
+def wantedKeystream(pairs):
+  """
+  keystream letters the pairs (offset, plaintext, ciphertext) pin down,
+  as a list by offset with None where nothing is known
+  """
+  want = []
+  for offset, plaintext, ciphertext in pairs:
+    plaintext = codec.clean(plaintext)
+    ciphertext = codec.clean(ciphertext)
+    if len(plaintext) != len(ciphertext) or offset < 0:
+      raise Exception("pair (%s, %s) doesn't line up..." % (plaintext, ciphertext))
+    # ciphertext - plaintext = keystream, same as decrypting with them swapped
+    letters = codec.subtractLetters(ciphertext, plaintext)
+    if len(want) < offset + len(letters):
+      want.extend([None]*(offset + len(letters) - len(want)))
+    for i, letter in enumerate(letters):
+      if want[offset+i] != None and want[offset+i] != letter:
+        raise Exception("pairs disagree at offset %d..." % (offset+i))
+      want[offset+i] = letter
+  return want
+
+def matches(perm, want):
+  """True if deck perm (bytearray, changed!) makes the wanted keystream"""
+  fd = FastDeck.__new__(FastDeck)
+  fd.perm = perm
+  step = fd.step
+  i = 0
+  n = len(want)
+  while i < n:
+    outcard = step()
+    if outcard != None:
+      letter = want[i]
+      if letter != None and LETTERS[outcard] != letter:
+        return False
+      i += 1
+  return True
+
+def searchChunk(args):
+  """try every candidate that starts with prefix (in a worker)"""
+  template, holes, missing, want, prefix = args
+  base = bytearray(template)
+  for hole, code in zip(holes, prefix):
+    base[hole] = code
+  rest = [code for code in missing if code not in prefix]
+  restholes = holes[len(prefix):]
+  found = []
+  tested = 0
+  for combo in permutations(rest):
+    perm = bytearray(base)
+    for hole, code in zip(restholes, combo):
+      perm[hole] = code
+    if matches(perm, want):
+      # perm has been stepped along, so put the candidate together again
+      perm = bytearray(base)
+      for hole, code in zip(restholes, combo):
+        perm[hole] = code
+      found.append(bytes(perm))
+    tested += 1
+  return tested, found
+
+def search(template, holes, missing, want, jobs=1, progress=None):
+  """
+  try every completion, return the matching decks (54 bytes each, in a
+  fixed order whatever jobs is). progress(tested) is called as each
+  piece of the search finishes.
+  """
+  # split by the cards in the first one or two unknown positions
+  depth = min(len(holes), 1 if len(missing) > 4*jobs else 2)
+  if len(missing) <= 1:
+    depth = 0
+  prefixes = list(permutations(missing, depth))
+  args = [(template, holes, missing, want, prefix) for prefix in prefixes]
+  found = []
+  tested = 0
+  if jobs == 1:
+    results = map(searchChunk, args)
+    for chunktested, chunkfound in results:
+      tested += chunktested
+      found.extend(chunkfound)
+      if progress != None:
+        progress(tested)
+    return found
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    for chunktested, chunkfound in pool.map(searchChunk, args):
+      tested += chunktested
+      found.extend(chunkfound)
+      if progress != None:
+        progress(tested)
+  return found
+
+# --------------------------------------- #
+
+if __name__ == "__main__":
+  main()
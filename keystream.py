@@ -0,0 +1,98 @@
+"""
+resumable solitaire keystream
+
+A Keystream wraps the current deck order and how many letters have
+been made so far. Save it to a state file after a message and load it
+again for the next one, so sender and receiver both carry on from where
+they stopped (and never reuse keystream) without going back to the
+keyfile:
+
+  ks = Keystream(readCards("keyfile"))
+  letters = ks.take(25)
+  ks.save("alice.state")
+  ...
+  ks = Keystream.load("alice.state")   # picks up at letter 25
+
+The state file looks like a keyfile (comment lines, then the 108-char
+deck order), with the letter count on the line after the order, so it
+can also be used directly with sea.py -k.
+"""
+
+from fastdeck import FastDeck
+import os
+
+class Keystream(object):
+  """iterator of keystream letters whose state can be saved and restored"""
+
+  def __init__(self, d, count=0):
+    """start from deck d (a Deck or FastDeck), count letters already made"""
+    if isinstance(d, FastDeck):
+      self.fd = d.copy()
+    else:
+      self.fd = FastDeck.fromDeck(d)
+    self.count = count
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    """return the next keystream letter"""
+    letter = self.fd.nextLetter()
+    self.count += 1
+    return letter
+
+  def take(self, n):
+    """return the next n keystream letters as a string"""
+    kstrm = self.fd.generateKeystream(n)
+    self.count += n
+    return kstrm
+
+  def getOrder(self):
+    """return the current deck order (108-char string)"""
+    return self.fd.getOrder()
+
+  def getDeck(self):
+    """return a Deck in the current order"""
+    return self.fd.toDeck()
+
+  def save(self, fn):
+    """
+    write the state to file fn. Goes through a temp file and a rename,
+    so a crash can't leave a half-written (or old) state behind.
+    """
+    tmp = fn + ".tmp"
+    ofile = open(tmp, "w")
+    ofile.write("# solitaire keystream state: deck order after %d letters\n"
+                % (self.count))
+    ofile.write(self.getOrder() + "\n")
+    ofile.write("%d\n" % (self.count))
+    ofile.close()
+    os.replace(tmp, fn)
+
+  @classmethod
+  def load(cls, fn):
+    """read a state file written by save(), return the Keystream"""
+    inf = open(fn, "r")
+    lines = [line.strip() for line in inf if line.strip() != ""]
+    inf.close()
+    lines = [line for line in lines if line[0] != "#"]
+    if len(lines) < 1:
+      raise Exception("state file (%s) has no deck order..." % (fn))
+    count = 0
+    if len(lines) > 1:
+      if not lines[1].isdigit():
+        raise Exception("state file (%s) has a bad letter count..." % (fn))
+      count = int(lines[1])
+    return cls(FastDeck(lines[0]), count)
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  ks = Keystream(FastDeck())
+  print("first 10 letters: %s" % ks.take(10))
+  print("next 5 letters: %s" % "".join([next(ks) for i in range(5)]))
+  print("letters so far: %d" % ks.count)
+
+if __name__ == "__main__":
+  main()
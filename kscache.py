@@ -0,0 +1,214 @@
+"""
+cache of keystream prefixes, keyed by the starting deck order
+
+Services that see the same key decks over and over can ask the cache
+for the first n keystream letters instead of running the solitaire
+steps from the top of the deck every time:
+
+  cache = KeystreamCache(maxbytes=2**24, diskdir="kscache")
+  ks = cache.keystream(readCards("keyfile"), 500)
+
+Each entry holds the letters made so far plus the deck state after the
+last one, so a longer request just carries on from the end of what's
+cached. Recently used entries live in memory (least recently used ones
+are pushed out when the letters add up to more than maxbytes). If a
+diskdir is given, pushed-out entries are written there and read back
+through mmap, so short requests for a cold key only touch the pages
+they need, and the oldest files are deleted when they add up to more
+than maxdiskbytes. Counts of hits/misses/etc are in cache.stats.
+
+It's safe to share between threads. The lock is only held to look
+things up and move entries around; making letters and disk I/O are
+done outside it, and a thread asking for a deck order another thread
+is already working on waits for that one order only.
+
+The cache doesn't move the deck it's given along (unlike
+generateKeystream), it only returns the letters.
+"""
+
+from fastdeck import FastDeck
+from collections import OrderedDict
+import hashlib
+import threading
+import mmap
+import os
+
+STATESIZE = 54    # bytes of deck state at the front of each disk file
+
+class KeystreamCache(object):
+  """two-level (memory LRU, then mmap files) keystream prefix cache"""
+
+  def __init__(self, maxbytes=16*2**20, diskdir=None, maxdiskbytes=256*2**20):
+    self.maxbytes = maxbytes
+    self.diskdir = diskdir
+    self.maxdiskbytes = maxdiskbytes
+    if diskdir != None:
+      os.makedirs(diskdir, exist_ok=True)
+    self.entries = OrderedDict()    # order -> (letters, state after them)
+    self.nbytes = 0
+    self.inflight = {}              # order -> Event, set when it's done
+    self.lock = threading.Lock()    # entries, nbytes, inflight, stats
+    self.disklock = threading.Lock()
+    self.stats = {"hits":0, "diskhits":0, "misses":0, "extended":0,
+                  "evictions":0, "diskwrites":0}
+
+  def __len__(self):
+    return len(self.entries)
+
+  def keystream(self, d, n):
+    """return the first n keystream letters for deck d (Deck, FastDeck,
+    or 108-char order string)"""
+    if isinstance(d, str):
+      order = d.upper()
+    else:
+      order = d.getOrder()
+    # only one thread works on a given order at a time, the others wait
+    # for it (outside the lock) and then look again
+    while True:
+      with self.lock:
+        entry = self.entries.get(order)
+        if entry != None and len(entry[0]) >= n:
+          self.stats["hits"] += 1
+          self.entries.move_to_end(order)
+          return entry[0][:n].decode()
+        done = self.inflight.get(order)
+        if done == None:
+          done = self.inflight[order] = threading.Event()
+          if entry != None:
+            self.stats["hits"] += 1
+          break
+      done.wait()
+    # nothing else touches this order now, so make the letters (and do
+    # any disk I/O) without holding the lock
+    evicted = []
+    try:
+      if entry == None:
+        letters = self._readDisk(order, n)
+        if letters != None:
+          self._count("diskhits")
+          return letters
+        entry = self._loadDisk(order)
+        if entry != None:
+          self._count("diskhits")
+        else:
+          self._count("misses")
+          entry = (b"", FastDeck(order).toBytes())
+      if len(entry[0]) < n:
+        self._count("extended")
+        entry = self._extend(entry, n)
+      with self.lock:
+        old = self.entries.pop(order, None)
+        if old != None:
+          self.nbytes -= len(old[0]) + STATESIZE
+        self.entries[order] = entry
+        self.nbytes += len(entry[0]) + STATESIZE
+        evicted = self._evict()
+    finally:
+      with self.lock:
+        del self.inflight[order]
+      done.set()
+    if self.diskdir != None and evicted != []:
+      self._spill(evicted)
+    return entry[0][:n].decode()
+
+  def _count(self, stat):
+    """add one to one of the stats"""
+    with self.lock:
+      self.stats[stat] += 1
+
+  def _extend(self, entry, n):
+    """entry with more letters, carrying on from its saved deck"""
+    fd = FastDeck.fromBytes(entry[1])
+    more = fd.generateKeystream(n - len(entry[0])).encode()
+    return (entry[0] + more, fd.toBytes())
+
+  def _evict(self):
+    """take least recently used entries out until under maxbytes (call
+    with the lock held), return them for the disk tier"""
+    evicted = []
+    while self.nbytes > self.maxbytes:
+      order, entry = self.entries.popitem(last=False)
+      self.nbytes -= len(entry[0]) + STATESIZE
+      self.stats["evictions"] += 1
+      evicted.append((order, entry))
+    return evicted
+
+  def _spill(self, evicted):
+    """write evicted entries to the disk tier, then trim it"""
+    with self.disklock:
+      for order, entry in evicted:
+        if len(entry[0]) + STATESIZE <= self.maxdiskbytes:
+          self._writeDisk(order, entry)
+      self._trimDisk()
+
+  def _diskName(self, order):
+    """file name for given deck order in the disk tier"""
+    return os.path.join(self.diskdir,
+                        hashlib.sha1(order.encode()).hexdigest() + ".ks")
+
+  def _writeDisk(self, order, entry):
+    """save an entry as: 54 bytes of deck state, then the letters"""
+    fn = self._diskName(order)
+    tmp = fn + ".tmp"
+    ofile = open(tmp, "wb")
+    ofile.write(entry[1])
+    ofile.write(entry[0])
+    ofile.close()
+    os.replace(tmp, fn)
+    self._count("diskwrites")
+
+  def _trimDisk(self):
+    """delete the oldest disk files until under maxdiskbytes"""
+    files = []
+    for fn in os.listdir(self.diskdir):
+      if fn.endswith(".ks"):
+        st = os.stat(os.path.join(self.diskdir, fn))
+        files.append((st.st_mtime, st.st_size, fn))
+    total = sum([size for mtime, size, fn in files])
+    for mtime, size, fn in sorted(files):
+      if total <= self.maxdiskbytes:
+        break
+      os.remove(os.path.join(self.diskdir, fn))
+      total -= size
+
+  def _readDisk(self, order, n):
+    """if the disk tier has at least n letters for order, return them"""
+    if self.diskdir == None:
+      return None
+    try:
+      inf = open(self._diskName(order), "rb")
+    except FileNotFoundError:
+      return None
+    mm = mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ)
+    letters = None
+    if len(mm) - STATESIZE >= n:
+      letters = mm[STATESIZE:STATESIZE+n].decode()
+    mm.close()
+    inf.close()
+    return letters
+
+  def _loadDisk(self, order):
+    """read a whole entry back from the disk tier (or None)"""
+    if self.diskdir == None:
+      return None
+    try:
+      inf = open(self._diskName(order), "rb")
+    except FileNotFoundError:
+      return None
+    data = inf.read()
+    inf.close()
+    return (data[STATESIZE:], data[:STATESIZE])
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  cache = KeystreamCache(maxbytes=1000)
+  fd = FastDeck()
+  print(cache.keystream(fd, 10))
+  print(cache.keystream(fd, 20))
+  print(cache.keystream(fd, 5))
+  print(cache.stats)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,141 @@
+"""
+sparse checkpoint index, for decrypting a piece from deep inside a long
+message without making all the keystream before it
+
+While encrypting, an IndexedKeystream saves the deck order (54 bytes)
+every K letters. writeIndex puts them in a small sidecar file, and
+KeystreamIndex.seek uses it to start a Keystream at any letter offset
+from the nearest snapshot before it:
+
+  ks = IndexedKeystream(readCards("keyfile"), 4096)
+  letters = ks.take(len(msg))
+  ks.writeIndex("msg.idx")
+  ...
+  ks = KeystreamIndex.load("msg.idx").seek(readCards("keyfile"), 500000)
+
+The file is a header (all big-endian: 8-byte magic "SOLINDX1", 2-byte
+version, 2 bytes unused, 4-byte K, 8-byte letter count, 32-byte SHA-256
+of the starting deck order) then the snapshots, the deck after K, 2K,
+3K, ... letters. The hash ties the index to its key: seek won't use it
+with any other deck. Each snapshot gives away all the keystream after
+it, so keep the index as secret as the keyfile.
+"""
+
+from keystream import Keystream
+from fastdeck import FastDeck
+import struct
+import os
+
+MAGIC = b"SOLINDX1"
+VERSION = 1
+HEADER = struct.Struct(">8sHHIQ32s")
+EVERY = 65536           # default letters between snapshots
+
+def keyHash(d):
+  """SHA-256 (bytes) of the order of deck d (Deck or FastDeck)"""
+  import hashlib
+  return hashlib.sha256(d.getOrder().encode()).digest()
+
+class IndexedKeystream(Keystream):
+  """Keystream that keeps a snapshot of the deck every 'every' letters"""
+
+  def __init__(self, d, every=EVERY):
+    """start from deck d (a Deck or FastDeck), at letter 0"""
+    Keystream.__init__(self, d)
+    if every < 1:
+      raise Exception("snapshot spacing (%d) must be at least 1..." % (every))
+    self.every = every
+    self.keyhash = keyHash(self.fd)
+    self.snapshots = []
+
+  def __next__(self):
+    """return the next keystream letter"""
+    letter = Keystream.__next__(self)
+    if self.count % self.every == 0:
+      self.snapshots.append(self.fd.toBytes())
+    return letter
+
+  def take(self, n):
+    """return the next n keystream letters as a string"""
+    pieces = []
+    while n > 0:
+      m = min(n, self.every - self.count%self.every)
+      pieces.append(Keystream.take(self, m))
+      n -= m
+      if self.count % self.every == 0:
+        self.snapshots.append(self.fd.toBytes())
+    return "".join(pieces)
+
+  def writeIndex(self, fn):
+    """write the index file for the letters made so far (atomically)"""
+    tmp = fn + ".tmp"
+    ofile = open(tmp, "wb")
+    ofile.write(HEADER.pack(MAGIC, VERSION, 0, self.every, self.count,
+                            self.keyhash))
+    for snapshot in self.snapshots:
+      ofile.write(snapshot)
+    ofile.close()
+    os.replace(tmp, fn)
+
+class KeystreamIndex(object):
+  """an index file read back in"""
+
+  def __init__(self, every, letters, keyhash, snapshots):
+    self.every = every
+    self.letters = letters
+    self.keyhash = keyhash
+    self.snapshots = snapshots
+
+  @classmethod
+  def load(cls, fn):
+    """read an index file written by IndexedKeystream.writeIndex"""
+    inf = open(fn, "rb")
+    data = inf.read()
+    inf.close()
+    if len(data) < HEADER.size:
+      raise Exception("index file (%s) is too short..." % (fn))
+    magic, version, unused, every, letters, keyhash = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+      raise Exception("index file (%s) isn't an index file..." % (fn))
+    if version != VERSION:
+      raise Exception("index file (%s) is version %d, not %d..." %
+                      (fn, version, VERSION))
+    if every < 1 or len(data) != HEADER.size + 54*(letters//every):
+      raise Exception("index file (%s) is the wrong size..." % (fn))
+    snapshots = [data[i:i+54] for i in range(HEADER.size, len(data), 54)]
+    return cls(every, letters, keyhash, snapshots)
+
+  def seek(self, d, start):
+    """
+    a Keystream that starts at letter offset start of the keystream from
+    key deck d, begun from the nearest snapshot at or before start
+    """
+    if keyHash(d) != self.keyhash:
+      raise Exception("index is for a different key...")
+    if start < 0 or start > self.letters:
+      raise Exception("offset %d is outside the %d indexed letters..." %
+                      (start, self.letters))
+    i = start // self.every
+    if i == 0:
+      ks = Keystream(d)
+    else:
+      ks = Keystream(FastDeck.fromBytes(self.snapshots[i-1]), i*self.every)
+    ks.take(start - ks.count)
+    return ks
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  ks = IndexedKeystream(FastDeck(), 100)
+  letters = ks.take(1000)
+  ks.writeIndex("example.idx")
+  index = KeystreamIndex.load("example.idx")
+  print("%d snapshots, %d bytes" % (len(index.snapshots),
+                                    os.path.getsize("example.idx")))
+  print("letters 750-760: %s" % index.seek(FastDeck(), 750).take(10))
+  print("should match:    %s" % letters[750:760])
+  os.remove("example.idx")
+
+if __name__ == "__main__":
+  main()
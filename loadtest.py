@@ -0,0 +1,116 @@
+#! /usr/bin/python3
+
+"""
+load test for the en/decryption service (service.py)
+
+Runs --clients connections at once, each sending --messages messages of
+--size random letters one after another over its own connection, and
+reports the message latency percentiles and overall throughput. With
+--spawn it starts its own service in this process first, so there's no
+need to have one running.
+
+  ./loadtest.py --spawn --clients 50 --messages 20 --size 2000
+  ./loadtest.py --port 5454 -k alice --keydir keys --check
+"""
+
+from service import *
+import random
+import click
+import time
+
+@click.command()
+@click.option('--host',default='127.0.0.1',help="service address")
+@click.option('--port',default=5454,help="service TCP port")
+@click.option('--socket',default='',help="use this Unix socket instead")
+@click.option('--spawn',is_flag=True,help="start a service here to test against")
+@click.option('--max-sessions',default=64,help="session limit of a --spawn service")
+@click.option('--workers',default=4,help="worker threads of a --spawn service")
+@click.option('--clients',default=10,help="connections at once")
+@click.option('--messages',default=10,help="messages sent by each client")
+@click.option('--size',default=1000,help="letters per message")
+@click.option('--chunksize',default=CHUNKSIZE,help="letters per frame sent")
+@click.option('-k','--key',default='',help="name of a key the service has (default: -p)")
+@click.option('--keydir',default='',
+              help="keyfile directory, for a --spawn service and --check")
+@click.option('-p','--passphrase',default='loadtest',help="key the deck from a passphrase")
+@click.option('--seed',default=0,help="seed for the random messages")
+@click.option('--check',is_flag=True,help="check every reply against crypt()")
+def main(host,port,socket,spawn,max_sessions,workers,clients,messages,size,
+         chunksize,key,keydir,passphrase,seed,check):
+  """hit the service with lots of messages, report latencies"""
+  if key != '':
+    header = {"direction": "encrypt", "key": key}
+  else:
+    header = {"direction": "encrypt", "passphrase": passphrase}
+  rng = random.Random(seed)
+  texts = ["".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for i in range(size))
+           for j in range(clients)]
+  result = asyncio.run(loadTest(header, texts, messages, chunksize, host, port,
+                                socket, spawn, max_sessions, workers, keydir))
+  print(formatResult(result))
+  if check:
+    for text, letters in result["replies"].items():
+      if codec.fives(letters) != crypt(text, headerDeck(header, keydir)):
+        raise click.ClickException("wrong reply from the service")
+    print("replies check out")
+
+# ------------------------------------------------- #
+
+async def client(header, text, messages, chunksize, host, port, socket,
+                 latencies, replies):
+  """one connection: send text messages times, recording each latency"""
+  reader, writer = await connect(host, port, socket)
+  chunks = [text[i:i+chunksize] for i in range(0, len(text), chunksize)]
+  try:
+    for i in range(messages):
+      start = time.perf_counter()
+      letters = await request(reader, writer, header, chunks)
+      latencies.append(time.perf_counter() - start)
+    replies[text] = letters
+  finally:
+    writer.close()
+
+async def loadTest(header, texts, messages, chunksize, host="127.0.0.1",
+                   port=5454, socket='', spawn=False, maxsessions=64, workers=4,
+                   keydir=''):
+  """run one client per text at once, return latencies and throughput"""
+  server = None
+  if spawn:
+    service = Server(maxsessions, workers, keydir)
+    server = await startServer(service, host, port, socket)
+  latencies = []
+  replies = {}
+  start = time.perf_counter()
+  try:
+    await asyncio.gather(*[client(header, text, messages, chunksize, host,
+                                  port, socket, latencies, replies)
+                           for text in texts])
+  finally:
+    secs = time.perf_counter() - start
+    if server != None:
+      server.close()
+      await server.wait_closed()
+      service.close()
+  letters = sum(len(text) for text in texts)*messages
+  return {"latencies": sorted(latencies), "secs": secs,
+          "messages": len(latencies), "letters": letters, "replies": replies}
+
+def percentile(values, pct):
+  """pct percentile (0-100) of sorted values, nearest rank"""
+  if len(values) == 0:
+    return 0.0
+  i = max(0, min(len(values)-1, int(round(pct/100*len(values))) - 1))
+  return values[i]
+
+def formatResult(result):
+  """the latency percentiles and throughput, as lines of text"""
+  lat = result["latencies"]
+  lines = ["%d messages in %.2f secs: %.1f messages/sec, %d letters/sec" %
+           (result["messages"], result["secs"], result["messages"]/result["secs"],
+            result["letters"]/result["secs"])]
+  for name, pct in [("p50", 50), ("p90", 90), ("p99", 99), ("max", 100)]:
+    lines.append("%-4s %10.2f ms" % (name, percentile(lat, pct)*1000))
+  return "\n".join(lines)
+
+if __name__ == "__main__":
+  main()
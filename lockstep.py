@@ -0,0 +1,165 @@
+"""
+keystream for many decks at once, all stepped together with NumPy
+
+The K decks are the rows of a K x 54 array of FastDeck card codes, and
+one round of the algorithm is done to every row at once. The joker
+positions are kept for each row, so moving a joker is a swap of two
+columns in every row (plus a shift for the few rows where it goes off
+the bottom). The triple cut and count cut only depend on where the
+jokers are and the bottom card, so the new order of every row is one
+gather, with the "which old position does this come from" indexes
+looked up in tables made when the module is imported. Rows whose
+output card is a joker just don't write a letter that round, and rows
+that have all the letters they need are put back as they were, so
+every deck ends up exactly as it would after its own generateKeystream.
+
+Good for getting the first few hundred letters for lots of keys, as
+when decrypting a pile of short messages under different keys. Each
+round costs about the same for 1 deck as for 50, so it only beats
+FastDeck one deck at a time from there up (about 4x at 1000 decks):
+
+  ksb = KeystreamBatch([readCards(fn) for fn in keyfiles])
+  streams = ksb.generateKeystreams(300)        # or a length per deck
+  results = cryptMessages(msgs, decks, encrypt=False)
+"""
+
+from fastdeck import FastDeck, LJ, BJ
+import numpy
+import codec
+
+# the triple and count cuts are gathers: row r of the new decks is old
+# row r at these positions. TRIPLECUT[54*first + second] is the triple
+# cut with the jokers at first < second, COUNTCUT[count] the count cut.
+_first = numpy.arange(54)[:, None, None]
+_second = numpy.arange(54)[None, :, None]
+_j = numpy.arange(54)[None, None, :]
+_nafter = 53 - _second
+TRIPLECUT = numpy.where(_j < _nafter, _second+1+_j,
+            numpy.where(_j <= _nafter + _second - _first, _j - _nafter + _first,
+                        _j - _nafter - (_second - _first + 1)))
+TRIPLECUT = (TRIPLECUT % 54).astype(numpy.uint8).reshape(54*54, 54)
+COUNTCUT = numpy.array([[(j+count) % 53 for j in range(53)] + [53]
+                        for count in range(54)], numpy.uint8)
+# keystream letter (as ASCII) for each card code; jokers never get used
+LETTERCODES = numpy.array([65 + code%26 for code in range(54)], numpy.uint8)
+
+class KeystreamBatch(object):
+  """K solitaire decks as a K x 54 array, stepped in lockstep"""
+
+  def __init__(self, decks):
+    """decks is a list of FastDecks and/or Decks (copied, not changed)"""
+    perms = []
+    for d in decks:
+      if not isinstance(d, FastDeck):
+        d = FastDeck.fromDeck(d)
+      perms.append(d.toBytes())
+    k = len(perms)
+    self.perms = numpy.frombuffer(b"".join(perms), numpy.uint8).reshape(k, 54).copy()
+    self.rows = numpy.arange(k)
+    self.base = (self.rows * 54)[:, None]
+    # joker positions are kept up to date as the decks change
+    self.lj = (self.perms == LJ).argmax(axis=1)
+    self.bj = (self.perms == BJ).argmax(axis=1)
+
+  def __len__(self):
+    return len(self.perms)
+
+  def getDecks(self):
+    """current order of each deck, as a list of FastDecks"""
+    return [FastDeck.fromBytes(row.tobytes()) for row in self.perms]
+
+  def _moveDown1(self, joker):
+    """move joker (LJ or BJ) down one in every deck (off the bottom: to spot 1)"""
+    if joker == LJ:
+      i, other = self.lj, self.bj
+    else:
+      i, other = self.bj, self.lj
+    perms = self.perms
+    wrap = i == 53
+    rows = self.rows[~wrap]
+    j = i[rows]
+    perms[rows, j] = perms[rows, j+1]
+    perms[rows, j+1] = joker
+    other[rows] = numpy.where(other[rows] == j+1, j, other[rows])
+    i[rows] = j+1
+    if wrap.any():
+      rows = self.rows[wrap]
+      perms[rows, 2:] = perms[rows, 1:53]
+      perms[rows, 1] = joker
+      other[rows] += other[rows] > 0
+      i[rows] = 1
+
+  def step(self):
+    """
+    one round of the algorithm on every deck. Returns the output card
+    codes and a mask of which decks gave a letter (output not a joker)
+    """
+    self._moveDown1(LJ)
+    self._moveDown1(BJ)
+    self._moveDown1(BJ)
+    first = numpy.minimum(self.lj, self.bj)
+    second = numpy.maximum(self.lj, self.bj)
+    triplecut = TRIPLECUT[54*first + second]
+    # count cut by the value of the card the triple cut leaves at the
+    # bottom (a joker: count 0, no cut), done in the same gather
+    last = self.perms[self.rows, triplecut[:, 53]]
+    count = numpy.where(last < LJ, last.astype(numpy.intp)+1, 0)
+    index = triplecut.ravel()[COUNTCUT[count] + self.base]
+    self.perms = self.perms.ravel()[index + self.base]
+    for p in [self.lj, self.bj]:
+      p += 53 - second - first
+      p -= count
+      p += numpy.where(p < 0, 53, 0)
+    # output card: count down value of top card (either joker is 53)
+    top = self.perms[:, 0].astype(numpy.intp)
+    outcards = self.perms[self.rows, numpy.minimum(top+1, 53)]
+    return outcards, outcards < LJ
+
+  def generateKeystreams(self, n):
+    """
+    n keystream letters from every deck (n can also be a list, with
+    a length for each deck), returned as a list of strings
+    """
+    need = numpy.broadcast_to(numpy.asarray(n, numpy.intp), (len(self),)).copy()
+    letters = numpy.zeros((len(self), max(need.max(initial=0), 0)), numpy.uint8)
+    have = numpy.zeros(len(self), numpy.intp)
+    active = have < need
+    while active.any():
+      done = self.rows[~active]
+      saved = (self.perms[done], self.lj[done], self.bj[done])
+      outcards, gotletter = self.step()
+      self.perms[done], self.lj[done], self.bj[done] = saved
+      rows = numpy.nonzero(gotletter & active)[0]
+      letters[rows, have[rows]] = LETTERCODES[outcards[rows]]
+      have[rows] += 1
+      active = have < need
+    return [letters[r, :need[r]].tobytes().decode() for r in range(len(self))]
+
+def cryptMessages(msgs, decks, encrypt=True):
+  """
+  clean and pad each message, en/decrypt msgs[i] with decks[i], return
+  the results in groups of 5 -- same as crypt() on each pair in turn
+  """
+  msgs = [codec.pad(codec.clean(msg)) for msg in msgs]
+  streams = KeystreamBatch(decks).generateKeystreams([len(msg) for msg in msgs])
+  if encrypt:
+    combine = codec.addLetters
+  else:
+    combine = codec.subtractLetters
+  return [codec.fives(combine(msg, ks)) for msg, ks in zip(msgs, streams)]
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  decks = [FastDeck()]
+  for i in range(3):
+    d = FastDeck()
+    d.keyPassphrase("SECRET" + "ABC"[i])
+    decks.append(d)
+  for ks in KeystreamBatch(decks).generateKeystreams(20):
+    print(ks)
+  print(cryptMessages(["attack at dawn", "hello"], decks[:2]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,125 @@
+"""
+packed ciphertext: letters stored at 5 bits each instead of as text
+
+The classic format is letters in groups of 5 with a space between
+groups, 1.2 bytes a letter. Packed, every 8 letters (A=0 .. Z=25) go in
+5 bytes, big-endian, first letter in the top bits:
+
+  SOL5 <version:1> <fill:1> <letters:8>  (14-byte header)
+  <5 bytes per 8 letters>
+
+The last group of 8 is filled out with A's; fill says how many, and
+letters how many there really are, so unpacking gives back exactly
+what was packed.
+
+Letters are turned into 5-bit numbers (and back) with bytes.translate
+tables. The packing itself works a column at a time: letters 0, 8,
+16, .. of the message are one bytes object, letters 1, 9, 17, .. the
+next, and so on. Each column is read as one big int, so a shift and a
+mask moves the bits of every letter in the column at once (each byte is
+masked so nothing spills into the byte next to it), and the 5 columns
+of output bytes are put back together with slice assignment. No
+per-letter Python code runs, so big messages go at close to memcpy
+speed.
+
+  data = pack("ABCDEFGHIJ")
+  letters = unpack(data)
+"""
+
+import struct
+
+MAGIC = b"SOL5"
+VERSION = 1
+HEADER = struct.Struct(">4sBBQ")     # magic, version, fill, letters
+
+UPPERCASE = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# bytes.translate tables: A-Z -> 0-25, and 0-25 -> A-Z
+VALUES = bytes(range(26))
+TOVALUES = bytes.maketrans(UPPERCASE, VALUES)
+TOLETTERS = bytes.maketrans(VALUES, UPPERCASE)
+
+def _lanes(byte, n):
+  """int with byte repeated n times (a mask for every byte of a column)"""
+  return int.from_bytes(bytes([byte])*n, "big")
+
+def _column(b):
+  """bytes -> int, one byte per lane"""
+  return int.from_bytes(b, "big")
+
+def pack(letters):
+  """pack a string of A-Z letters into header + 5 bits per letter"""
+  raw = letters.encode()
+  if len(raw.translate(None, UPPERCASE)) != 0:
+    raise Exception("can only pack uppercase letters A-Z...")
+  n = len(raw)
+  fill = (8 - n%8) % 8
+  values = raw.translate(TOVALUES) + bytes(fill)
+  ngroups = len(values) // 8
+  v = [_column(values[i::8]) for i in range(8)]
+  m = lambda byte: _lanes(byte, ngroups)
+  columns = [
+    (v[0] << 3) | ((v[1] & m(0x1c)) >> 2),
+    ((v[1] & m(0x03)) << 6) | (v[2] << 1) | ((v[3] & m(0x10)) >> 4),
+    ((v[3] & m(0x0f)) << 4) | ((v[4] & m(0x1e)) >> 1),
+    ((v[4] & m(0x01)) << 7) | (v[5] << 2) | ((v[6] & m(0x18)) >> 3),
+    ((v[6] & m(0x07)) << 5) | v[7]]
+  out = bytearray(5*ngroups)
+  for i in range(5):
+    out[i::5] = columns[i].to_bytes(ngroups, "big")
+  return HEADER.pack(MAGIC, VERSION, fill, n) + bytes(out)
+
+def isPacked(data):
+  """True if data (bytes) starts like packed ciphertext"""
+  return data[:len(MAGIC)] == MAGIC
+
+def parseHeader(data):
+  """(fill, letters, packed bytes) from packed ciphertext"""
+  if len(data) < HEADER.size or not isPacked(data):
+    raise Exception("not packed ciphertext (no %s header)..." % (MAGIC.decode()))
+  magic, version, fill, n = HEADER.unpack(data[:HEADER.size])
+  if version != VERSION:
+    raise Exception("packed ciphertext version %d, can only read %d..." %
+                    (version, VERSION))
+  body = data[HEADER.size:]
+  ngroups = (n + 7) // 8
+  if fill != 8*ngroups - n or len(body) != 5*ngroups:
+    raise Exception("packed ciphertext is %d bytes, header says %d letters..." %
+                    (len(body), n))
+  return fill, n, body
+
+def unpack(data):
+  """packed ciphertext (bytes) -> string of A-Z letters"""
+  fill, n, body = parseHeader(data)
+  ngroups = len(body) // 5
+  b = [_column(body[i::5]) for i in range(5)]
+  m = lambda byte: _lanes(byte, ngroups)
+  columns = [
+    (b[0] & m(0xf8)) >> 3,
+    ((b[0] & m(0x07)) << 2) | ((b[1] & m(0xc0)) >> 6),
+    (b[1] & m(0x3e)) >> 1,
+    ((b[1] & m(0x01)) << 4) | ((b[2] & m(0xf0)) >> 4),
+    ((b[2] & m(0x0f)) << 1) | ((b[3] & m(0x80)) >> 7),
+    (b[3] & m(0x7c)) >> 2,
+    ((b[3] & m(0x03)) << 3) | ((b[4] & m(0xe0)) >> 5),
+    b[4] & m(0x1f)]
+  values = bytearray(8*ngroups)
+  for i in range(8):
+    values[i::8] = columns[i].to_bytes(ngroups, "big")
+  del values[n:]
+  if len(values.translate(None, VALUES)) != 0:
+    raise Exception("packed ciphertext has letters past Z, must be damaged...")
+  return values.translate(TOLETTERS).decode()
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  letters = "WELOVECOMPUTERSCIENCEXXX"
+  data = pack(letters)
+  print("%d letters -> %d bytes (%d header)" % (len(letters), len(data), HEADER.size))
+  print(data.hex())
+  print(unpack(data))
+  assert(unpack(data) == letters)
+
+if __name__ == "__main__":
+  main()
@@ -12,7 +12,23 @@ Spring 2019
 
 from card import *
 from deck import *
+from fastdeck import FastDeck, passphraseLetters
+from keystream import Keystream
+from stats import Stats, timer
+from deckring import Keyring
+from ksindex import IndexedKeystream, KeystreamIndex, EVERY
+import segments
+import packed
+from itertools import islice
+from collections import OrderedDict
+import codec
 import click
+import threading
+import time
+import sys
+import os
+
+CHUNKSIZE = 64*1024     # characters read at a time in --stream mode
 
 # ------------------------------------------------- #
 # Still TODO:
@@ -27,24 +43,233 @@ import click
 @click.option('-o','--outfile',
               default='',
               help="output file for results of en/decryption")
-@click.option('-k','--keyfile',required=True, type=str,
+@click.option('-k','--keyfile',default='', type=str,
               help="keyfile containing initial deck of cards order")
-def main(msgfile,encrypt,outfile,keyfile):
+@click.option('--engine',type=click.Choice(['fast','deck']),default='fast',
+              help="keystream engine: integer-permutation (fast) or Card/Deck")
+@click.option('--stream',is_flag=True,
+              help="read/write in chunks (msg from stdin if no msgfile)")
+@click.option('--pipe',type=click.Choice(['lines','length']),default=None,
+              help="en/decrypt many messages from stdin (or msgfile) with "
+                   "one key: one per line, or each after a line with its "
+                   "length in bytes")
+@click.option('--keyring',default='',
+              help="keyring file to take the key deck from (with --key-id)")
+@click.option('--key-id',default='',help="ID of the key deck in --keyring")
+@click.option('-p','--passphrase',default='',
+              help="key the deck from this passphrase instead of a keyfile")
+@click.option('--state',default='',
+              help="keystream state file: resume from it if it exists "
+                   "(else start from keyfile), save to it when done")
+@click.option('--index',default='',
+              help="checkpoint index file: written when encrypting, "
+                   "used by --range when decrypting (needs --range then)")
+@click.option('--every',default=EVERY,
+              help="letters between --index checkpoints")
+@click.option('--range','span',default='',
+              help="decrypt only letters START:END (0-based, END not included)")
+@click.option('--segment-size',default=0,
+              help="encrypt in segments of this many letters, done in "
+                   "parallel (decrypting finds the segments by itself)")
+@click.option('-j','--jobs',default=1,
+              help="worker processes for segmented messages (0: one per core)")
+@click.option('--format','fmt',type=click.Choice(['text','packed']),default='text',
+              help="ciphertext format: letters in groups of 5 (text) or "
+                   "5 bits a letter (packed, binary)")
+@click.option('--stats',is_flag=True,
+              help="print step counts and stage/step times to stderr")
+@click.option('--stats-format',type=click.Choice(['human','json']),
+              default='human',help="format for --stats")
+@click.option('--profile',is_flag=True,
+              help="run under cProfile, print the top functions to stderr")
+def main(msgfile,encrypt,outfile,keyfile,engine,stream,pipe,keyring,key_id,
+         passphrase,state,index,every,span,segment_size,jobs,fmt,stats,
+         stats_format,profile):
   """get message, get deck of cards, then encrypt/decrypt the message"""
-  if msgfile=='':
-    msg = pad(clean(input("msg: ")))
+  runstats = None
+  if stats:
+    runstats = Stats()
+  if (keyring=='') != (key_id==''):
+    raise click.UsageError("--keyring and --key-id go together")
+  if [keyfile!='', keyring!='', passphrase!=''].count(True) > 1:
+    raise click.UsageError("give just one key: -k, --keyring/--key-id or -p")
+  if passphrase!='':
+    try:
+      passphraseLetters(passphrase)
+    except Exception as e:
+      raise click.UsageError(str(e))
+  if index!='' and state!='':
+    raise click.UsageError("--index starts from the key, so not with --state")
+  if span!='':
+    if encrypt or stream or state!='':
+      raise click.UsageError("--range only decrypts, without --stream or --state")
+    span = parseRange(span)
+  elif index!='' and not encrypt:
+    raise click.UsageError("--index is only read by --range when decrypting")
+  if segment_size>0 and (stream or state!='' or index!=''):
+    raise click.UsageError("--segment-size doesn't go with --stream, "
+                           "--state or --index")
+  if pipe!=None and (stream or index!='' or span!='' or segment_size>0):
+    raise click.UsageError("--pipe doesn't go with --stream, --index, "
+                           "--range or --segment-size")
+  if fmt=='packed' and (stream or pipe!=None or segment_size>0):
+    raise click.UsageError("--format packed doesn't go with --stream, "
+                           "--pipe or --segment-size")
+  if jobs < 1:
+    jobs = os.cpu_count() or 1
+  args = (msgfile,encrypt,outfile,keyfile,engine,stream,passphrase,state,
+          runstats,keyring,key_id,index,every,span,segment_size,jobs,pipe,fmt)
+  if profile:
+    import cProfile, pstats
+    profiler = cProfile.Profile()
+    profiler.runcall(run, *args)
+    pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
   else:
-    msg = pad(clean(readFile(msgfile)))
-  deckofcards = readCards(keyfile)
+    run(*args)
+  if stats:
+    print(runstats.report(stats_format), file=sys.stderr)
+
+def run(msgfile,encrypt,outfile,keyfile,engine,stream,passphrase,state,
+        stats=None,keyring='',key_id='',index='',every=EVERY,span='',
+        segsize=0,jobs=1,pipe=None,fmt='text'):
+  """en/decrypt one message (see main for the arguments)"""
+  if state!='' and os.path.exists(state):
+    deckofcards = Keystream.load(state)
+  elif keyfile!='' or passphrase!='' or keyring!='':
+    if keyfile!='':
+      deckofcards = readCards(keyfile)
+    elif keyring!='':
+      kr = Keyring(keyring)
+      deckofcards = kr.getDeck(key_id)
+      kr.close()
+    else:
+      deckofcards = passphraseDeck(passphrase)
+    if state!='':
+      deckofcards = Keystream(deckofcards)
+    elif index!='' and encrypt:
+      deckofcards = IndexedKeystream(deckofcards, every)
+  else:
+    raise click.UsageError("need a keyfile (-k), --keyring and --key-id, "
+                           "a passphrase (-p) or an existing --state file")
+  if pipe!=None:
+    if msgfile=='':
+      inf = sys.stdin.buffer
+    else:
+      inf = open(msgfile, "rb")
+    if outfile=='':
+      outf = sys.stdout.buffer
+    else:
+      outf = open(outfile, "wb")
+    pipeCrypt(inf, outf, deckofcards, encrypt, pipe, engine=='fast', stats)
+    if msgfile!='':
+      inf.close()
+    if outfile!='':
+      outf.close()
+    if state!='':
+      deckofcards.save(state)
+    return
+  if stream:
+    if msgfile=='':
+      inf = sys.stdin
+    else:
+      inf = openFile(msgfile, "Message file", "msgfile: ")
+    if outfile=='':
+      outf = sys.stdout
+    else:
+      outf = open(outfile, "w")
+    streamCrypt(inf, outf, deckofcards, encrypt, fast=(engine=='fast'),
+                stats=stats)
+    if msgfile!='':
+      inf.close()
+    if outfile!='':
+      outf.close()
+    if state!='':
+      deckofcards.save(state)
+    elif index!='' and encrypt:
+      deckofcards.writeIndex(index)
+    return
+  with timer(stats, "read"):
+    if fmt=='packed' and not encrypt:
+      msg = readPacked(msgfile)
+    elif msgfile=='':
+      msg = input("msg: ")
+    else:
+      msg = readFile(msgfile)
+  if stats != None:
+    stats.count("bytesIn", len(msg))
+  if segsize>0 or (fmt=='text' and not encrypt and segments.isSegmented(msg)):
+    if isinstance(deckofcards, Keystream):
+      raise click.UsageError("segmented messages start from the key, not --state")
+    with timer(stats, "keystream"):
+      if encrypt:
+        result = segments.encryptSegmented(msg, deckofcards, segsize, jobs)
+      elif span!='':
+        # segments don't depend on each other: no --index needed
+        result = codec.fives(segments.decryptSegmented(msg, deckofcards, jobs, span))
+      else:
+        result = codec.fives(segments.decryptSegmented(msg, deckofcards, jobs))
+    with timer(stats, "write"):
+      writeText(result, outfile)
+    return
+  with timer(stats, "clean"):
+    msg = codec.pad(codec.clean(msg))
+  if span!='':
+    decryptRange(msg, deckofcards, span, index, outfile)
+    return
   nletters = len(msg)
-  keystream = generateKeystream(deckofcards,nletters)
-  msgnums = letters2numbers(msg)
-  kstnums = letters2numbers(keystream)
-  if encrypt:
-    newnums = add(msgnums,kstnums)
+  with timer(stats, "keystream"):
+    if state!='':
+      keystream = deckofcards.take(nletters)
+      deckofcards.save(state)
+    elif index!='' and encrypt:
+      keystream = deckofcards.take(nletters)
+      deckofcards.writeIndex(index)
+    else:
+      keystream = generateKeystream(deckofcards,nletters,engine=='fast',stats)
+  with timer(stats, "combine"):
+    letters = combine(msg,keystream,encrypt)
+  with timer(stats, "write"):
+    if fmt=='packed' and encrypt:
+      nbytes = writePacked(letters, outfile)
+    else:
+      writeLetters(letters, outfile)
+      nbytes = None
+  if stats != None:
+    if nbytes == None:
+      nbytes = len(codec.fives(letters)) + 1
+    stats.count("bytesOut", nbytes)
+
+def parseRange(span):
+  """START:END (END may be left off, for the rest) -> (start, end or None)"""
+  try:
+    start, end = span.split(":")
+    start = int(start)
+    if end == "":
+      end = None
+    else:
+      end = int(end)
+  except ValueError:
+    raise click.BadParameter("range (%s) should be START:END" % (span))
+  if start < 0 or (end != None and end < start):
+    raise click.BadParameter("range (%s) should be START:END" % (span))
+  return (start, end)
+
+def decryptRange(msg, d, span, index, outfile):
+  """
+  decrypt just letters start..end-1 of cleaned ciphertext msg. With an
+  index file the keystream starts from the nearest checkpoint,
+  otherwise from letter 0 of key deck d.
+  """
+  start, end = span
+  if end == None or end > len(msg):
+    end = len(msg)
+  start = min(start, end)
+  if index!='':
+    ks = KeystreamIndex.load(index).seek(d, start)
   else:
-    newnums = subtract(msgnums,kstnums)
-  output(newnums, outfile)
+    ks = Keystream(d)
+    ks.take(start)
+  writeLetters(combine(msg[start:end], ks.take(end-start), False), outfile)
 
 # ------------------------------------------------- #
 # better way using % operator??? but nums need to be 1-26...
@@ -66,52 +291,85 @@ def subtract(L1, L2):
     newL.append(diff)
   return newL
 
+def crypt(msg, d, encrypt=True, fast=True):
+  """
+  clean and pad message string msg, en/decrypt it with deck d (Deck or
+  FastDeck), return the result in groups of 5
+  """
+  msg = codec.pad(codec.clean(msg))
+  keystream = generateKeystream(d,len(msg),fast)
+  return codec.fives(combine(msg,keystream,encrypt))
+
+def combine(msg, keystream, encrypt=True):
+  """add (encrypt) or subtract (decrypt) keystream letters, mod 26"""
+  if encrypt:
+    return codec.addLetters(msg,keystream)
+  return codec.subtractLetters(msg,keystream)
+
 def output(numlist, outfile):
   """convert numlist back to letters, send to outfile/stdout"""
-  letters = []
-  for n in numlist:
-    letters.append(chr(n-1+ord("A")))
-  outstr = "".join(letters)
+  writeLetters(numbers2letters(numlist), outfile)
+
+def writeLetters(outstr, outfile):
+  """send letters in groups of 5 to outfile/stdout"""
+  writeText(codec.fives(outstr), outfile)
+
+def writeText(text, outfile):
+  """send already formatted text to outfile/stdout"""
   if outfile=='':
-    print(fives(outstr))
+    print(text)
   else:
     ofile = open(outfile, "w")
-    ofile.write(fives(outstr) + "\n")
+    ofile.write(text + "\n")
     ofile.close()
 
+def writePacked(letters, outfile):
+  """send letters packed 5 bits each to outfile/stdout, return bytes written"""
+  data = packed.pack(letters)
+  if outfile=='':
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+  else:
+    ofile = open(outfile, "wb")
+    ofile.write(data)
+    ofile.close()
+  return len(data)
+
+def readPacked(fn):
+  """read packed ciphertext from given filename (stdin if none), as letters"""
+  if fn=='':
+    return packed.unpack(sys.stdin.buffer.read())
+  inf = open(fn, "rb")
+  data = inf.read()
+  inf.close()
+  return packed.unpack(data)
+
 def fives(S):
   """
   given string S, return letters in groups a 5 (ie, with space after
   every 5th letter: ABCDE FGHIJ KLMNO ETC..
   """
-  newS = ""
-  for i in range(len(S)):
-    if i%5==0 and i>0:
-      newS += " "
-    newS += S[i]
-  return newS
+  return " ".join([S[i:i+5] for i in range(0, len(S), 5)])
 
-def readFile(fn):
-  """read and return message from given filename"""
+def openFile(fn, what, prompt):
+  """open given file for reading, asking again if it's not there"""
   while True:
     try:
-      inf = open(fn, "r")
-      break
+      return open(fn, "r")
     except FileNotFoundError:
-      print("Message file (%s) not found." % (fn))
-      fn = input("msgfile: ")
-  orig = inf.readlines()
+      print("%s (%s) not found." % (what, fn))
+      fn = input(prompt)
+
+def readFile(fn):
+  """read and return message from given filename"""
+  inf = openFile(fn, "Message file", "msgfile: ")
+  orig = inf.read()
   inf.close()
-  return "".join(orig)
+  return orig
 
 def clean(orig):
   """given a string, clean it up (only uppercase letters)"""
-  cleaned = ""
-  for line in orig:
-    for ch in line:
-      if ch.isalpha():
-        cleaned += ch.upper()
-  return cleaned
+  return "".join([ch.upper() for ch in orig if ch.isalpha()])
 
 def pad(orig):
   """given a string, pad it with X's so multiple of 5"""
@@ -123,38 +381,40 @@ def pad(orig):
 
 def readCards(fn):
   """read deck of cards order from given filename, return deck"""
-  while True:
-    try:
-      inf = open(fn, "r")
-      break
-    except FileNotFoundError:
-      print("Keyfile (%s) not found." % (fn))
-      fn = input("keyfile: ")
-  order = inf.readline().strip()
-  # skip the commented out lines and just grab first non-comment
-  while order[0] == "#":
-    order = inf.readline().strip()
-  if len(order) != 54*2:
-    raise Exception("keyfile not a valid deck of cards...")
-  d = Deck(order)
+  inf = openFile(fn, "Keyfile", "keyfile: ")
+  line = inf.readline()
+  # skip the commented out (and blank) lines and just grab first non-comment
+  while line != "" and (line.strip() == "" or line.strip()[0] == "#"):
+    line = inf.readline()
+  inf.close()
+  order = line.strip()
+  try:
+    d = Deck.fromOrder(order)
+  except Exception as e:
+    raise Exception("keyfile not a valid deck of cards: %s" % (e))
   return d
 
-def generateKeystream(d,n):
+def generateKeystream(d,n,fast=False,stats=None):
   """
   given deck of cards and number of letters (n), generate 
-  n keystream letters, return as a string
+  n keystream letters, return as a string. If fast is True, use
+  the integer-permutation FastDeck (same letters, same final deck).
+  d can also be a FastDeck, which is moved along the same way.
+  If a Stats object is given, count and time each step into it.
   """
+  if stats != None:
+    return timedKeystream(d,n,fast,stats)
+  if isinstance(d, FastDeck):
+    return d.generateKeystream(n)
+  if fast:
+    fd = FastDeck.fromDeck(d)
+    kstrm = fd.generateKeystream(n)
+    d.cards = fd.toDeck().cards
+    return kstrm
   kstrm = []
   i = 0
   while i < n:
-    index = d.getIndex("LJ")                # find the little joker
-    d.moveDown1(index)                      # move it down one
-    index = d.getIndex("BJ")                # find big joker
-    d.moveDown1(index)                      # move it down 
-    d.moveDown1(index+1)                    #              two
-    first,second = d.findJokers()           # find location of jokers 
-    d.tripleCut(first, second)              # triple cut on those locations
-    d.countCut()                            # now do the count cut
+    solitaireStep(d)                        # jokers, triple cut, count cut
     outputcard = d.outputCard()             # find the output card
     if outputcard != None:                  # go back to step 1 if it's a joker
       rn = outputcard.rankNum()             # convert it to 1-26, where
@@ -166,6 +426,255 @@ def generateKeystream(d,n):
       i += 1
   return "".join(kstrm)
 
+def timedKeystream(d,n,fast,stats):
+  """
+  same as generateKeystream, but counting and timing each step (joker
+  moves, triple cut, count cut, output card) into stats
+  """
+  if fast or isinstance(d, FastDeck):
+    fd = d
+    if not isinstance(d, FastDeck):
+      fd = FastDeck.fromDeck(d)
+    steps = [("jokers", fd.moveJokers), ("tripleCut", fd.tripleCut),
+             ("countCut", fd.countCut)]
+    output = fd.outputCard
+    toletter = lambda code: chr(ord('A') + code%26)
+  else:
+    steps = [("jokers", lambda: moveJokers(d)),
+             ("tripleCut", lambda: d.tripleCut(*d.findJokers())),
+             ("countCut", d.countCut)]
+    output = d.outputCard
+    toletter = lambda card: chr(ord('A') + (card.value-1)%26)
+  clock = time.perf_counter
+  kstrm = []
+  while len(kstrm) < n:
+    for name, step in steps:
+      start = clock()
+      step()
+      stats.addTime(name, clock() - start)
+      stats.count(name)
+    start = clock()
+    outputcard = output()
+    stats.addTime("outputCard", clock() - start)
+    stats.count("outputCard")
+    if outputcard == None:
+      stats.count("jokerSkips")
+    else:
+      kstrm.append(toletter(outputcard))
+  if fast and not isinstance(d, FastDeck):
+    d.cards = fd.toDeck().cards
+  return "".join(kstrm)
+
+def moveJokers(d):
+  """move the little joker down one and big joker down two in deck d"""
+  index = d.getIndex("LJ")                  # find the little joker
+  d.moveDown1(index)                        # move it down one
+  index = d.getIndex("BJ")                  # find big joker
+  d.moveDown1(index)                        # move it down 
+  index = d.getIndex("BJ")                  # (may have wrapped to top)
+  d.moveDown1(index)                        #              two
+
+def solitaireStep(d):
+  """do the joker moves, triple cut and count cut on deck d"""
+  moveJokers(d)
+  first,second = d.findJokers()             # find location of jokers 
+  d.tripleCut(first, second)                # triple cut on those locations
+  d.countCut()                              # now do the count cut
+
+def keyDeck(d, passphrase):
+  """
+  key deck d from a passphrase: for each letter do the solitaire steps
+  (no output card), then a count cut by the letter's value (A=1..Z=26)
+  """
+  for ch in passphraseLetters(passphrase):
+    solitaireStep(d)
+    d.countCut(ord(ch) - ord("A") + 1)
+
+MAXKEYED = 256          # passphrase decks remembered by passphraseDeck
+_keyedDecks = OrderedDict()
+_keyedLock = threading.Lock()    # service.py keys decks from worker threads
+
+def passphraseDeck(passphrase):
+  """
+  return a new Deck keyed from passphrase (starting from the deck in
+  order). The last MAXKEYED keyed orders are remembered, looked up by
+  a hash of the passphrase, so the keying steps only run once per
+  passphrase. Safe to call from more than one thread.
+  """
+  import hashlib
+  passphrase = passphraseLetters(passphrase)
+  key = hashlib.sha256(passphrase.encode()).digest()
+  with _keyedLock:
+    order = _keyedDecks.get(key)
+    if order != None:
+      _keyedDecks.move_to_end(key)
+  if order == None:
+    fd = FastDeck()
+    fd.keyPassphrase(passphrase)
+    order = fd.getOrder()
+    with _keyedLock:
+      _keyedDecks[key] = order
+      while len(_keyedDecks) > MAXKEYED:
+        _keyedDecks.popitem(last=False)
+  return Deck(order)
+
+def keystreamLetters(d, fast=True, stats=None):
+  """
+  generator of keystream letters from deck d, made one at a time as
+  they're needed. The Card/Deck path (fast=False) moves d along as it
+  goes; the fast path works on its own copy of the deck.
+  """
+  if stats != None:
+    if fast:
+      d = FastDeck.fromDeck(d)
+    while True:
+      yield timedKeystream(d, 1, fast, stats)
+  if fast:
+    fd = FastDeck.fromDeck(d)
+    while True:
+      yield fd.nextLetter()
+  else:
+    while True:
+      yield generateKeystream(d, 1)
+
+class StreamCrypter(object):
+  """en/decrypt a message a piece at a time, keystream drawn as needed"""
+
+  def __init__(self, d, encrypt=True, fast=True, stats=None):
+    """d is a Deck, or a Keystream to carry on from"""
+    if isinstance(d, Keystream):
+      self.keystream = d
+    else:
+      self.keystream = keystreamLetters(d, fast, stats)
+    self.encrypt = encrypt
+    self.nletters = 0
+    self.stats = stats
+
+  def update(self, text):
+    """clean the next piece of the message, return it en/decrypted"""
+    with timer(self.stats, "clean"):
+      msg = codec.clean(text)
+    with timer(self.stats, "keystream"):
+      keystream = "".join(islice(self.keystream, len(msg)))
+    self.nletters += len(msg)
+    with timer(self.stats, "combine"):
+      return combine(msg,keystream,self.encrypt)
+
+  def final(self):
+    """pad the message out to a multiple of 5, return the last letters"""
+    return self.update("X" * ((5 - self.nletters%5) % 5))
+
+class FivesWriter(object):
+  """write letters to a file in groups of 5, across any number of writes"""
+
+  def __init__(self, outf):
+    self.outf = outf
+    self.nletters = 0
+
+  def write(self, letters):
+    """add letters to the output, with a space before each new group"""
+    pieces = []
+    i = 0
+    while i < len(letters):
+      ingroup = self.nletters%5
+      if ingroup == 0 and self.nletters > 0:
+        pieces.append(" ")
+      group = letters[i:i+5-ingroup]
+      pieces.append(group)
+      i += len(group)
+      self.nletters += len(group)
+    self.outf.write("".join(pieces))
+
+  def close(self):
+    """end the output with a newline (like the non-streaming output)"""
+    self.outf.write("\n")
+
+def streamCrypt(inf, outf, d, encrypt=True, chunksize=CHUNKSIZE, fast=True,
+                stats=None):
+  """
+  en/decrypt everything in open file inf, writing the results to open
+  file outf in groups of 5 as it goes. Memory use stays the same no
+  matter how big the message is. Returns number of letters written.
+  """
+  crypter = StreamCrypter(d, encrypt, fast, stats)
+  writer = FivesWriter(outf)
+  while True:
+    with timer(stats, "read"):
+      chunk = inf.read(chunksize)
+    if chunk == "":
+      break
+    letters = crypter.update(chunk)
+    with timer(stats, "write"):
+      writer.write(letters)
+    if stats != None:
+      stats.count("bytesIn", len(chunk))
+  letters = crypter.final()
+  with timer(stats, "write"):
+    writer.write(letters)
+    writer.close()
+  if stats != None:
+    stats.count("bytesOut", writer.nletters + (writer.nletters-1)//5 + 1)
+  return writer.nletters
+
+def readMessages(inf, mode="lines"):
+  """
+  generator of messages (str) from binary file inf: one per line (mode
+  lines), or each after a line giving its length in bytes (mode length,
+  blank lines between messages are skipped)
+  """
+  while True:
+    line = inf.readline()
+    if line == b"":
+      return
+    if mode == "lines":
+      yield line.decode()
+      continue
+    size = line.strip()
+    if size == b"":
+      continue
+    if not size.isdigit():
+      raise Exception("bad message length (%s)..." % (size.decode(errors="replace")))
+    data = inf.read(int(size))
+    if len(data) < int(size):
+      raise Exception("message cut short (%d of %d bytes)..." % (len(data), int(size)))
+    yield data.decode()
+
+def pipeCrypt(inf, outf, d, encrypt=True, mode="lines", fast=True, stats=None):
+  """
+  en/decrypt each message read from binary file inf (see readMessages),
+  writing each result to binary file outf as soon as it's done: one
+  line per message (mode lines), or its length line, then the letters
+  and a newline (mode length). Every message starts from key deck d,
+  unless d is a Keystream, which carries on from message to message.
+  Returns number of messages.
+  """
+  if isinstance(d, Keystream):
+    keystreamFor = d.take
+  elif fast:
+    base = FastDeck.fromDeck(d)
+    keystreamFor = lambda n: base.copy().generateKeystream(n)
+  else:
+    order = d.getOrder()
+    keystreamFor = lambda n: generateKeystream(Deck.fromOrder(order), n)
+  count = 0
+  for text in readMessages(inf, mode):
+    msg = codec.pad(codec.clean(text))
+    with timer(stats, "keystream"):
+      keystream = keystreamFor(len(msg))
+    result = codec.fives(combine(msg, keystream, encrypt)).encode()
+    if mode == "length":
+      outf.write(b"%d\n" % (len(result)))
+    outf.write(result + b"\n")
+    outf.flush()
+    count += 1
+  if stats != None:
+    stats.count("messages", count)
+  return count
+
+def numbers2letters(nums):
+  """given a list of numbers 1 to 26, convert to uppercase letters"""
+  return "".join([chr(n-1+ord("A")) for n in nums])
+
 def letters2numbers(s):
   """given a string of uppercase letters, convert to numbers 1 to 26"""
   nums = []
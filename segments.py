@@ -0,0 +1,126 @@
+"""
+segmented ciphertext: split a long message into fixed-size segments that
+can be en/decrypted at the same time on different cores
+
+Solitaire keystream has to be made one letter after another, so one big
+message can only keep one core busy. In the segmented format each
+segment gets its own keystream, from the key deck keyed some more with
+a passphrase made from the segment number (SEGMENT then the number as 7
+letters, A=0 .. Z=25), so segment i never depends on segment i-1. The
+segments go through a process pool; the pool only changes how fast it
+goes, never the result.
+
+The container is a header line then the ciphertext in groups of 5:
+
+  SOLSEG1 <segment size> <segment count>
+  ABCDE FGHIJ ...
+
+The message is padded (with X's, to a multiple of 5) before it is split,
+as in the classic format, so only the last segment can be short.
+
+  text = encryptSegmented(msg, readCards("keyfile"), 10000, jobs=4)
+  msg = decryptSegmented(text, readCards("keyfile"), jobs=4)
+"""
+
+from fastdeck import FastDeck
+import codec
+
+MAGIC = "SOLSEG1"
+SEGSIZE = 65536         # default letters per segment
+
+def segmentKey(i):
+  """the passphrase (uppercase letters) that keys segment i"""
+  digits = []
+  for j in range(7):
+    digits.append(chr(ord("A") + i%26))
+    i //= 26
+  if i != 0:
+    raise Exception("too many segments...")
+  return "SEGMENT" + "".join(reversed(digits))
+
+def segmentDeck(order, i):
+  """FastDeck for segment i of a message keyed by deck order"""
+  fd = FastDeck(order)
+  fd.keyPassphrase(segmentKey(i))
+  return fd
+
+def cryptSegment(args):
+  """en/decrypt one segment (in a worker): (order, i, letters, encrypt)"""
+  order, i, letters, encrypt = args
+  keystream = segmentDeck(order, i).generateKeystream(len(letters))
+  if encrypt:
+    return codec.addLetters(letters, keystream)
+  return codec.subtractLetters(letters, keystream)
+
+def cryptSegments(letters, d, segsize, encrypt, jobs=1):
+  """split cleaned letters into segments, en/decrypt them, join them back"""
+  if segsize < 1:
+    raise Exception("segment size (%d) must be at least 1..." % (segsize))
+  order = d.getOrder()
+  args = [(order, i//segsize, letters[i:i+segsize], encrypt)
+          for i in range(0, len(letters), segsize)]
+  return runSegments(args, jobs)
+
+def runSegments(args, jobs=1):
+  """run cryptSegment on each of args, in order, join the results"""
+  if jobs == 1 or len(args) < 2:
+    return "".join(map(cryptSegment, args))
+  # only pay for loading multiprocessing when there's a pool to run
+  from concurrent.futures import ProcessPoolExecutor
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    return "".join(pool.map(cryptSegment, args))
+
+def encryptSegmented(msg, d, segsize=SEGSIZE, jobs=1):
+  """clean and pad msg, encrypt it with deck d, return the container text"""
+  letters = codec.pad(codec.clean(msg))
+  count = (len(letters) + segsize - 1)//segsize
+  ciphertext = cryptSegments(letters, d, segsize, True, jobs)
+  return "%s %d %d\n%s" % (MAGIC, segsize, count, codec.fives(ciphertext))
+
+def isSegmented(text):
+  """True if text starts with a segmented container header"""
+  return text.lstrip().startswith(MAGIC + " ")
+
+def parseHeader(text):
+  """split container text into (segment size, segment count, ciphertext)"""
+  header, sep, body = text.lstrip().partition("\n")
+  fields = header.split()
+  if len(fields) != 3 or fields[0] != MAGIC or not fields[1].isdigit() \
+     or not fields[2].isdigit():
+    raise Exception("bad segmented header (%s)..." % (header))
+  return int(fields[1]), int(fields[2]), body
+
+def decryptSegmented(text, d, jobs=1, span=None):
+  """
+  decrypt container text with deck d, return the (padded) letters. With
+  span=(start, end), just letters start..end-1 (end None: to the end),
+  and only the segments they're in get decrypted
+  """
+  segsize, count, body = parseHeader(text)
+  letters = codec.clean(body)
+  if segsize < 1 or (len(letters) + segsize - 1)//segsize != count:
+    raise Exception("segmented message should have %d segments of %d "
+                    "letters, but has %d letters..." % (count, segsize, len(letters)))
+  if span == None:
+    return cryptSegments(letters, d, segsize, False, jobs)
+  start, end = span
+  if end == None or end > len(letters):
+    end = len(letters)
+  start = min(start, end)
+  first = start - start%segsize
+  order = d.getOrder()
+  args = [(order, i//segsize, letters[i:i+segsize], False)
+          for i in range(first, end, segsize)]
+  return runSegments(args, jobs)[start-first:end-first]
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  d = FastDeck()
+  text = encryptSegmented("Do not use PC, meet at the usual place" * 3, d, 20)
+  print(text)
+  print(codec.fives(decryptSegmented(text, d)))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,278 @@
+#! /usr/bin/python3
+
+"""
+local en/decryption service, so programs don't have to start sea.py
+once per message
+
+Protocol: every frame is a 4-byte big-endian length, then that many
+bytes. A session goes:
+
+  client: header frame, JSON, e.g. {"direction": "encrypt",
+          "key": "alice"} (or "passphrase" instead of "key")
+  server: JSON frame {"ok": true} (or {"ok": false, "error": "..."})
+  client: message text frames (utf-8), as many as it likes
+  server: one frame back for each, the en/decrypted letters so far
+  client: empty frame (end of message)
+  server: one frame with the last letters (the padding, maybe none)
+
+then the client can start another message with a new header, or close.
+The solitaire work runs in a thread pool, so the event loop keeps
+answering other sessions while a big chunk is being done. Sessions past
+--max-sessions are turned away with an error.
+
+Clients name a key; the server looks the name up in its own --keydir
+(keyfiles named by key) or --keyring, so a client can only use the keys
+the server was given, never any file it can read. Errors about the
+request itself (bad direction, unknown key, ...) go back to the client
+as they are; anything else just gets "request failed" (the details go
+to the server's stderr).
+
+  ./service.py serve --port 5454 --keydir keys
+  ./service.py send --port 5454 -k alice -m datafiles/cs
+"""
+
+from sea import *
+from deckring import readKeyfile, checkId
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import struct
+import click
+import json
+
+LENGTH = struct.Struct(">I")
+MAXFRAME = 16*2**20     # biggest frame the server will accept
+
+async def readFrame(reader):
+  """read one frame, return its bytes (None if the other end closed)"""
+  try:
+    size = LENGTH.unpack(await reader.readexactly(LENGTH.size))[0]
+  except asyncio.IncompleteReadError:
+    return None
+  if size > MAXFRAME:
+    raise Exception("frame of %d bytes is too big..." % (size))
+  return await reader.readexactly(size)
+
+def writeFrame(writer, data):
+  """queue one frame (bytes) to be sent"""
+  writer.write(LENGTH.pack(len(data)) + data)
+
+class RequestError(Exception):
+  """something wrong with what the client asked for (safe to tell it)"""
+
+def headerDeck(header, keydir='', keyring=None):
+  """
+  the starting Deck for a session header: key (a keyfile name in
+  keydir, or an ID in the open Keyring keyring) or passphrase
+  """
+  if "key" in header:
+    name = header["key"]
+    try:
+      checkId(name)
+    except Exception:
+      raise RequestError("unknown key")
+    if keyring != None:
+      if name not in keyring:
+        raise RequestError("unknown key")
+      return keyring.getDeck(name)
+    if keydir == '':
+      raise RequestError("this server has no keys, use a passphrase")
+    fn = os.path.join(keydir, name)
+    if not os.path.isfile(fn):
+      raise RequestError("unknown key")
+    return Deck.fromOrder(readKeyfile(fn))
+  if "passphrase" in header:
+    try:
+      passphraseLetters(header["passphrase"])
+    except Exception as e:
+      raise RequestError(str(e))      # never has the passphrase in it
+    return passphraseDeck(header["passphrase"])
+  raise RequestError("header needs key or passphrase")
+
+def errorReply(e):
+  """the error frame for exception e: only request errors say what's wrong"""
+  if isinstance(e, RequestError):
+    message = str(e)
+  else:
+    print("service: %s: %s" % (type(e).__name__, e), file=sys.stderr)
+    message = "request failed"
+  return json.dumps({"ok": False, "error": message}).encode()
+
+class Server(object):
+  """the en/decryption service: one session per connection at a time"""
+
+  def __init__(self, maxsessions=64, workers=4, keydir='', keyring=''):
+    """keys come from keyfiles in keydir, or the keyring file keyring"""
+    self.keydir = keydir
+    self.keyring = None
+    if keyring != '':
+      self.keyring = Keyring(keyring)
+    self.maxsessions = maxsessions
+    self.sessions = 0
+    self.executor = ThreadPoolExecutor(max_workers=workers)
+
+  def close(self):
+    """done serving: stop the worker threads, close the keyring"""
+    self.executor.shutdown()
+    if self.keyring != None:
+      self.keyring.close()
+
+  async def handle(self, reader, writer):
+    """run sessions on one connection until the client closes it"""
+    if self.sessions >= self.maxsessions:
+      writeFrame(writer, json.dumps({"ok": False, "error": "server busy"}).encode())
+      await writer.drain()
+      writer.close()
+      return
+    self.sessions += 1
+    try:
+      while await self.session(reader, writer):
+        pass
+    except Exception as e:
+      try:
+        writeFrame(writer, errorReply(e))
+        await writer.drain()
+      except Exception:
+        pass
+    finally:
+      self.sessions -= 1
+      writer.close()
+
+  async def session(self, reader, writer):
+    """one message: header, chunks, end. Returns False when client is gone"""
+    loop = asyncio.get_running_loop()
+    frame = await readFrame(reader)
+    if frame == None:
+      return False
+    try:
+      try:
+        header = json.loads(frame.decode())
+      except ValueError:
+        raise RequestError("header isn't JSON")
+      if not isinstance(header, dict):
+        raise RequestError("header isn't a JSON object")
+      direction = header.get("direction", "encrypt")
+      if direction not in ["encrypt", "decrypt"]:
+        raise RequestError("direction should be encrypt or decrypt")
+      d = await loop.run_in_executor(self.executor, headerDeck, header,
+                                     self.keydir, self.keyring)
+    except Exception as e:
+      writeFrame(writer, errorReply(e))
+      await writer.drain()
+      return True
+    writeFrame(writer, json.dumps({"ok": True}).encode())
+    await writer.drain()
+    crypter = StreamCrypter(d, direction=="encrypt")
+    while True:
+      frame = await readFrame(reader)
+      if frame == None:
+        return False
+      if len(frame) == 0:
+        break
+      letters = await loop.run_in_executor(self.executor, crypter.update,
+                                           frame.decode())
+      writeFrame(writer, letters.encode())
+      await writer.drain()
+    letters = await loop.run_in_executor(self.executor, crypter.final)
+    writeFrame(writer, letters.encode())
+    await writer.drain()
+    return True
+
+async def startServer(server, host="127.0.0.1", port=5454, socket=''):
+  """start listening (TCP, or on a Unix socket), return asyncio server"""
+  if socket != '':
+    return await asyncio.start_unix_server(server.handle, path=socket)
+  return await asyncio.start_server(server.handle, host, port)
+
+async def connect(host="127.0.0.1", port=5454, socket=''):
+  """open a connection to the service, return (reader, writer)"""
+  if socket != '':
+    return await asyncio.open_unix_connection(socket)
+  return await asyncio.open_connection(host, port)
+
+async def request(reader, writer, header, chunks):
+  """
+  run one message through an open connection: send header, then each
+  text chunk, then the end. Returns all the letters that came back.
+  """
+  writeFrame(writer, json.dumps(header).encode())
+  await writer.drain()
+  reply = json.loads((await readFrame(reader)).decode())
+  if not reply["ok"]:
+    raise Exception("service error: %s" % (reply["error"]))
+  pieces = []
+  for chunk in chunks:
+    writeFrame(writer, chunk.encode())
+    await writer.drain()
+    pieces.append((await readFrame(reader)).decode())
+  writeFrame(writer, b"")
+  await writer.drain()
+  pieces.append((await readFrame(reader)).decode())
+  return "".join(pieces)
+
+async def sendMessage(header, text, chunksize=CHUNKSIZE, host="127.0.0.1",
+                      port=5454, socket=''):
+  """connect, en/decrypt one message, close; returns the letters"""
+  reader, writer = await connect(host, port, socket)
+  try:
+    chunks = [text[i:i+chunksize] for i in range(0, len(text), chunksize)]
+    return await request(reader, writer, header, chunks)
+  finally:
+    writer.close()
+
+# ------------------------------------------------- #
+
+@click.group()
+def main():
+  """run the en/decryption service, or send it a message"""
+
+@main.command()
+@click.option('--host',default='127.0.0.1',help="address to listen on")
+@click.option('--port',default=5454,help="TCP port to listen on")
+@click.option('--socket',default='',help="listen on this Unix socket instead")
+@click.option('--max-sessions',default=64,help="most sessions at once")
+@click.option('--workers',default=4,help="threads doing the solitaire work")
+@click.option('--keydir',default='',help="directory of keyfiles, named by key")
+@click.option('--keyring',default='',help="keyring file to take keys from instead")
+def serve(host,port,socket,max_sessions,workers,keydir,keyring):
+  """run the service until interrupted"""
+  if keydir!='' and keyring!='':
+    raise click.UsageError("give --keydir or --keyring, not both")
+  service = Server(max_sessions, workers, keydir, keyring)
+  async def run():
+    server = await startServer(service, host, port, socket)
+    async with server:
+      await server.serve_forever()
+  try:
+    asyncio.run(run())
+  except KeyboardInterrupt:
+    pass
+  finally:
+    service.close()
+
+@main.command()
+@click.option('--host',default='127.0.0.1',help="service address")
+@click.option('--port',default=5454,help="service TCP port")
+@click.option('--socket',default='',help="use this Unix socket instead")
+@click.option('-m','--msgfile',default='',help="message file (default stdin)")
+@click.option('--encrypt/--decrypt','-e/-d',default=True,
+              help="encrypt/decrypt the message (default=encrypt)")
+@click.option('-k','--key',default='',help="name of a key the service has")
+@click.option('-p','--passphrase',default='',help="key the deck from a passphrase")
+def send(host,port,socket,msgfile,encrypt,key,passphrase):
+  """send one message to the service, print the result"""
+  if (key=='') == (passphrase==''):
+    raise click.UsageError("give one of -k or -p")
+  header = {"direction": "encrypt" if encrypt else "decrypt"}
+  if key != '':
+    header["key"] = key
+  else:
+    header["passphrase"] = passphrase
+  if msgfile == '':
+    text = sys.stdin.read()
+  else:
+    text = readFile(msgfile)
+  print(codec.fives(asyncio.run(sendMessage(header, text, host=host,
+                                            port=port, socket=socket))))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,101 @@
+"""
+shoe of several decks, for dealing lots of cards fast (simulations)
+
+The shoe keeps card ordinals (0-53, see card.py) in one bytearray and
+a pointer to the next card, so dealing a card is just reading the next
+byte and looking up its (shared) Card -- nothing is popped off a list
+or made new. Each shoe has its own random.Random, so workers given
+different seeds get independent, repeatable shuffles:
+
+  s = Shoe(6, seed="%d:%d" % (seed, worker))
+  hand = s.deal(2)              # list of 2 Cards
+  c = s.dealCard()
+  s.reshuffle()                 # all the cards back in, shuffled
+
+reset() goes back to the top without shuffling, to replay the same
+cards. dealOrdinals(n) gives the raw ordinals (bytes), the fastest way
+to deal when the Card objects aren't needed.
+"""
+
+from deck import *
+import random
+
+# the shared Card for each ordinal
+BYORDINAL = [None]*54
+for c in CARDTABLE.values():
+  BYORDINAL[c.ordinal] = c
+
+class Shoe(object):
+  """ndecks decks (jokers left out unless asked for), shuffled together"""
+
+  def __init__(self, ndecks=1, jokers=False, seed=None):
+    """make and shuffle the shoe; seed (int or str) makes it repeatable"""
+    if ndecks < 1:
+      raise Exception("Shoe needs at least one deck...")
+    ordinals = [c.ordinal for c in Deck().cards
+                if jokers or c.getSuit() != "J"]
+    self.cards = bytearray(ordinals * ndecks)
+    self.rng = random.Random(seed)
+    self.reshuffle()
+
+  def __len__(self):
+    """number of cards left to deal"""
+    return len(self.cards) - self.next
+
+  def __str__(self):
+    """the cards left, in order"""
+    return " ".join([str(BYORDINAL[o]) for o in self.cards[self.next:]])
+
+  def isEmpty(self):
+    """return True if every card has been dealt"""
+    return self.next >= len(self.cards)
+
+  def dealCard(self):
+    """deal one card from the shoe"""
+    i = self.next
+    if i >= len(self.cards):
+      raise Exception("Tried to deal from empty shoe...")
+    self.next = i + 1
+    return BYORDINAL[self.cards[i]]
+
+  def deal(self, n):
+    """deal n cards, return them as a list"""
+    return [BYORDINAL[o] for o in self.dealOrdinals(n)]
+
+  def dealOrdinals(self, n):
+    """deal n cards, return their ordinals (bytes)"""
+    i = self.next
+    if n < 0 or i + n > len(self.cards):
+      raise Exception("Tried to deal %d cards, only %d left..." % (n, len(self)))
+    self.next = i + n
+    return bytes(self.cards[i:i+n])
+
+  def reset(self):
+    """go back to the top of the shoe (same order, nothing shuffled)"""
+    self.next = 0
+
+  def reshuffle(self):
+    """put every card back and shuffle the shoe"""
+    self.rng.shuffle(self.cards)
+    self.next = 0
+
+  def seed(self, seed):
+    """reseed this shoe's random number generator"""
+    self.rng.seed(seed)
+
+# ---------------------------------------------- #
+
+def main():
+  """some simple examples"""
+  s = Shoe(6, seed=1)
+  print("%d cards in the shoe" % (len(s)))
+  print("hand: %s %s" % tuple(s.deal(2)))
+  print("next card: %s" % (s.dealCard()))
+  s.reset()
+  print("same hand again: %s %s" % tuple(s.deal(2)))
+  s.reshuffle()
+  hand = s.deal(2)
+  print("after reshuffle: %s %s (%d left)" % (hand[0], hand[1], len(s)))
+
+if __name__ == "__main__":
+  main()
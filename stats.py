@@ -0,0 +1,74 @@
+"""
+counters and timers for finding out where a run spends its time
+
+  stats = Stats()
+  with timer(stats, "read"):
+    msg = readFile(fn)
+  stats.count("bytesIn", len(msg))
+  print(stats.report())
+
+timer(None, name) does nothing, so code can always call it and only
+pay for the timing when a Stats object is passed in.
+"""
+
+import time
+
+class Stats(object):
+  """named counters and cumulative timers"""
+
+  def __init__(self):
+    self.counts = {}
+    self.times = {}
+
+  def count(self, name, n=1):
+    """add n to counter name"""
+    self.counts[name] = self.counts.get(name, 0) + n
+
+  def addTime(self, name, secs):
+    """add secs to timer name"""
+    self.times[name] = self.times.get(name, 0.0) + secs
+
+  def report(self, fmt="human"):
+    """return the counters and timers as text (human) or JSON"""
+    if fmt == "json":
+      import json
+      return json.dumps({"counts": self.counts, "times": self.times},
+                        indent=2, sort_keys=True)
+    lines = []
+    for name in self.counts:
+      lines.append("%-20s %12d" % (name, self.counts[name]))
+    for name in self.times:
+      lines.append("%-20s %12.6f secs" % (name, self.times[name]))
+    return "\n".join(lines)
+
+class _Timer(object):
+  """context manager that adds the time inside it to a Stats timer"""
+
+  def __init__(self, stats, name):
+    self.stats = stats
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.stats.addTime(self.name, time.perf_counter() - self.start)
+    return False
+
+class _NoTimer(object):
+  """context manager that does nothing (when stats are off)"""
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+NOTIMER = _NoTimer()
+
+def timer(stats, name):
+  """time a with block into stats (if stats is None, don't)"""
+  if stats == None:
+    return NOTIMER
+  return _Timer(stats, name)
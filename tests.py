@@ -3,9 +3,36 @@
 import unittest, io, sys, os
 from card import *
 from deck import *
-from random import randrange, choice, shuffle
+from fastdeck import *
+from keystream import *
+from kscache import *
+import batch
+import codec
+import bench
+from stats import *
+import cycles
+import service
+from ksindex import *
+import segments
+import keysearch
+from shoe import Shoe
+import keygen
+import conformance
+import packed
+from deckring import *
+try:
+  import numpy
+  import battery
+except ImportError:
+  numpy = None
+try:
+  import lockstep
+except ImportError:
+  lockstep = None
+from random import randrange, choice, shuffle, Random
 from operator import itemgetter
 from sea import *
+import sea
 import subprocess
 
 class TestCards(unittest.TestCase):
@@ -56,6 +83,23 @@ class TestCards(unittest.TestCase):
     newcard = Card("Q","S")
     self.assertFalse(newcard == self.queenhearts)
 
+  def test_shared(self):
+    """test cards are shared, with ordinals/values matching the deck"""
+    self.assertTrue(Card("q","h") is self.queenhearts)
+    self.assertTrue(Deck("QH")[0] is self.queenhearts)
+    self.assertRaises(AttributeError, setattr, self.tenclubs, "other", 1)
+    for i in range(52):
+      c = self.doc[i]
+      self.assertEqual(c.value, i+1)
+      self.assertEqual(c.value, c.rankNum() + c.suitNum()*13)
+      self.assertEqual(c.ordinal, i)
+    self.assertEqual(self.bigjoker.value, 53)
+    self.assertEqual(self.littlejoker.value, 53)
+    self.assertTrue(self.tenclubs < self.queenhearts < self.bigjoker < self.littlejoker)
+    self.assertTrue(self.queenhearts >= Card("Q","H") > self.tenclubs)
+    self.assertRaises(Exception, self.bigjoker.rankNum)
+    self.assertRaises(Exception, self.littlejoker.suitNum)
+
   def test_deck(self):
     """test deck creation and dealing out cards"""
     i = 0
@@ -87,6 +131,26 @@ class TestCards(unittest.TestCase):
     for i in range(len(self.doc)):
        self.assertEqual(self.doc[i], newdeck[i])
 
+  def test_fromorder(self):
+    """test fast Deck construction and its validation"""
+    for i in range(10):
+      self.doc.shuffle()
+      order = self.doc.getOrder()
+      newdeck = Deck.fromOrder(order.lower())
+      self.assertEqual(newdeck.getOrder(), order)
+      self.assertTrue(newdeck._valid())
+      self.assertEqual(newdeck.getIndex("LJ"), order.index("LJ")//2)
+    self.assertRaises(Exception, Deck.fromOrder, order[:-2])
+    self.assertRaises(Exception, Deck.fromOrder, order[:-2] + "ZZ")
+    twice = order.replace(order[:2], order[2:4], 1)
+    try:
+      Deck.fromOrder(twice)
+      self.fail("repeated card not caught")
+    except Exception as e:
+      self.assertTrue(order[2:4] in str(e))
+    self.assertFalse(Deck(twice)._valid())
+    self.assertFalse(Deck(order[:-2])._valid())
+
   def test_movedown(self):
     """test the moveDown1 method"""
     cstr = "6D"
@@ -115,6 +179,22 @@ class TestCards(unittest.TestCase):
     onejokers = Deck("ASAHBJADAC")
     self.assertRaises(Exception, onejokers.findJokers)
 
+  def test_positions(self):
+    """test getIndex/findJokers stay right as the deck is cut and moved"""
+    self.doc.shuffle()
+    for i in range(200):
+      choice([lambda: self.doc.moveDown1(randrange(54)),
+              lambda: self.doc.tripleCut(*self.doc.findJokers()),
+              self.doc.countCut])()
+      order = self.doc.getOrder()
+      for cstr in ["LJ","BJ","AC",order[2*(i%54):2*(i%54)+2]]:
+        self.assertEqual(self.doc.getIndex(cstr), order.index(cstr)//2)
+      jokers = [j for j in range(54) if self.doc[j].getSuit() == "J"]
+      self.assertEqual(list(self.doc.findJokers()), jokers)
+    self.doc.dealCard()
+    self.assertEqual(self.doc.getIndex(order[2:4]), 0)
+    self.assertRaises(Exception, self.doc.getIndex, order[:2])
+
   def test_triplecut(self):
     """test the tripleCut method"""
     listorder = ["AS","BJ","AC","LJ","AD"]
@@ -198,6 +278,26 @@ class TestCards(unittest.TestCase):
     for i in range(len(alphabet)):
       self.assertEqual(letters2numbers(alphabet[i]),[i+1])
 
+  def test_fastdeck(self):
+    """test FastDeck keystream matches the Card/Deck keystream"""
+    for i in range(20):
+      self.doc.shuffle()
+      order = self.doc.getOrder()
+      if i%4 == 0:    # big joker on the bottom
+        order = order.replace("BJ","") + "BJ"
+      if i%4 == 1:    # little joker on the bottom
+        order = order.replace("LJ","") + "LJ"
+      mydeck = Deck(order)
+      fd = FastDeck(order)
+      self.assertEqual(fd.getOrder(), order)
+      self.assertEqual(generateKeystream(mydeck,100), fd.generateKeystream(100))
+      self.assertEqual(mydeck.getOrder(), fd.getOrder())
+      mydeck = Deck(order)
+      self.assertEqual(generateKeystream(Deck(order),50,True),
+                       generateKeystream(mydeck,50))
+    self.assertRaises(Exception, FastDeck, "ASAHADAC")
+    self.assertRaises(Exception, FastDeck, "AS"*54)
+
   def test_solitaire(self):
     """test the whole thing..."""
     # AAAAA AAAAA with inorder deck
@@ -211,6 +311,635 @@ class TestCards(unittest.TestCase):
     output = subprocess.run(command.split(), stdout=subprocess.PIPE)
     self.assertEqual(output.stdout.decode('utf-8').strip(), result)
 
+  def test_keyoptions(self):
+    """test sea.py won't take more than one key"""
+    for extra in ["-p foo", "--keyring datafiles/x.ring --key-id k"]:
+      command = "./sea.py -k datafiles/inorder -m datafiles/aaaaa " + extra
+      output = subprocess.run(command.split(), stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE)
+      self.assertEqual(output.returncode, 2)
+      self.assertIn("just one key", output.stderr.decode())
+    command = "./sea.py -p foo --keyring datafiles/x.ring --key-id k -m datafiles/aaaaa"
+    output = subprocess.run(command.split(), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    self.assertEqual(output.returncode, 2)
+
+  def test_stream(self):
+    """test streaming en/decryption matches the all-at-once version"""
+    text = "We love computer science!!! " * 7 + "abc, de"
+    order = Deck().getOrder()
+    expected = fives(numbers2letters(add(letters2numbers(pad(clean(text))),
+                 letters2numbers(generateKeystream(Deck(order),len(pad(clean(text))))))))
+    for chunksize in [1, 3, 5, 16, 1000]:
+      for fast in [True, False]:
+        outf = io.StringIO()
+        n = streamCrypt(io.StringIO(text), outf, Deck(order), True, chunksize, fast)
+        self.assertEqual(outf.getvalue(), expected + "\n")
+        self.assertEqual(n, len(pad(clean(text))))
+    outf = io.StringIO()
+    streamCrypt(io.StringIO(expected), outf, Deck(order), False, 7)
+    self.assertEqual(outf.getvalue().strip(), fives(pad(clean(text))))
+
+  def test_keystreamstate(self):
+    """test saving and resuming a keystream gives one long keystream"""
+    fn = "datafiles/teststate"
+    self.doc.shuffle()
+    order = self.doc.getOrder()
+    whole = generateKeystream(Deck(order), 60)
+    ks = Keystream(Deck(order))
+    first = ks.take(25) + "".join([next(ks) for i in range(5)])
+    ks.save(fn)
+    ks = Keystream.load(fn)
+    self.assertEqual(ks.count, 30)
+    self.assertEqual(first + ks.take(30), whole)
+    self.assertEqual(readCards(fn).getOrder(), Keystream.load(fn).getOrder())
+    os.remove(fn)
+
+  def test_kscache(self):
+    """test cached keystream prefixes match generateKeystream"""
+    diskdir = "datafiles/testcache"
+    cache = KeystreamCache(maxbytes=200, diskdir=diskdir)
+    orders = []
+    for i in range(3):
+      self.doc.shuffle()
+      orders.append(self.doc.getOrder())
+    for n in [10, 40, 5, 120, 60]:
+      for order in orders:
+        self.assertEqual(cache.keystream(Deck(order), n),
+                         generateKeystream(Deck(order), n))
+    self.assertEqual(cache.stats["misses"], 3)
+    self.assertTrue(cache.stats["hits"] > 0)
+    self.assertTrue(cache.stats["evictions"] > 0)
+    self.assertTrue(cache.stats["diskhits"] > 0)
+    self.assertTrue(cache.nbytes <= 200)
+    # one entry bigger than maxbytes isn't kept in memory either
+    self.assertEqual(cache.keystream(orders[0], 300),
+                     generateKeystream(Deck(orders[0]), 300))
+    self.assertTrue(cache.nbytes <= 200)
+    # the disk tier is trimmed to maxdiskbytes, oldest files first
+    cache.maxdiskbytes = 400
+    cache.keystream(orders[1], 250)
+    sizes = [os.path.getsize(os.path.join(diskdir, fn)) for fn in os.listdir(diskdir)]
+    self.assertTrue(sum(sizes) <= 400)
+    self.assertTrue(len(sizes) > 0)
+    # threads asking for the same and different orders all get the right letters
+    from concurrent.futures import ThreadPoolExecutor
+    cache = KeystreamCache(maxbytes=300, diskdir=diskdir)
+    jobs = [(orders[i%3], 20 + 7*i) for i in range(30)]
+    with ThreadPoolExecutor(4) as pool:
+      results = list(pool.map(lambda job: cache.keystream(*job), jobs))
+    for (order, n), ks in zip(jobs, results):
+      self.assertEqual(ks, generateKeystream(Deck(order), n))
+    self.assertEqual(cache.inflight, {})
+    self.assertTrue(cache.nbytes <= 300)
+    for fn in os.listdir(diskdir):
+      os.remove(os.path.join(diskdir, fn))
+    os.rmdir(diskdir)
+
+  def test_batch(self):
+    """test batch jobs give the same results as sea.py, in order"""
+    fn = "datafiles/testmanifest.csv"
+    ofile = open(fn,"w")
+    ofile.write("msgfile,keyfile,direction,outfile\n")
+    ofile.write("datafiles/cs,datafiles/inorder,encrypt,datafiles/testcs\n")
+    ofile.write("datafiles/nosuchfile,datafiles/inorder,encrypt,datafiles/testx\n")
+    ofile.write("datafiles/aaaaa,datafiles/inorder,e,datafiles/testaaaaa\n")
+    ofile.close()
+    joblist = batch.readManifest(fn)
+    results = batch.runJobs(joblist, 2)
+    self.assertEqual([r[0] for r in results], [True, False, True])
+    self.assertEqual([r[1] for r in results], [25, 0, 10])
+    for outfn, result in [("datafiles/testcs", "ABVMD DUUQW OGXZI XDWLM EWUWF"),
+                          ("datafiles/testaaaaa", "EXKYI ZSGEH")]:
+      inf = open(outfn)
+      self.assertEqual(inf.read().strip(), result)
+      inf.close()
+      os.remove(outfn)
+    os.remove(fn)
+
+  def test_codec(self):
+    """test the bulk codec functions match the sea.py ones"""
+    hasnumpy = codec.numpy
+    for usenumpy in [True, False]:
+      if not usenumpy:
+        codec.numpy = None
+      for length in [0, 3, 10, 64, 500]:
+        text = "".join([choice("abcXYZ, .!\n\tqQ9é") for i in range(length)])
+        self.assertEqual(codec.clean(text), clean(text))
+        self.assertEqual(codec.pad(clean(text)), pad(clean(text)))
+        self.assertEqual(codec.fives(pad(clean(text))), fives(pad(clean(text))))
+        nums = [randrange(1,27) for i in range(length)]
+        knums = [randrange(1,27) for i in range(length)]
+        self.assertEqual(codec.add(nums,knums), add(nums,knums))
+        self.assertEqual(codec.subtract(nums,knums), subtract(nums,knums))
+        msg = numbers2letters(nums)
+        self.assertEqual(codec.letters2numbers(msg), letters2numbers(msg))
+        self.assertEqual(codec.numbers2letters(nums), msg)
+        ks = numbers2letters(knums)
+        self.assertEqual(codec.addLetters(msg,ks), numbers2letters(add(nums,knums)))
+        self.assertEqual(codec.subtractLetters(msg,ks),
+                         numbers2letters(subtract(nums,knums)))
+    codec.numpy = hasnumpy
+
+  def test_passphrase(self):
+    """test passphrase keying against Schneier's test vectors"""
+    vectors = [("f", "XYIUQ BMHKK JBEGY"), ("foo", "ITHZU JIWGR FARMW"),
+               ("bcd", "FMUBY BMAXH NQXCJ"), ("cryptonomicon", "SUGSR SXSWQ RMXOH")]
+    for passphrase, result in vectors:
+      mydeck = Deck()
+      keyDeck(mydeck, passphrase)
+      self.assertEqual(crypt("A"*15, mydeck, True, False), result)
+      self.assertEqual(crypt("A"*15, passphraseDeck(passphrase)), result)
+    # remembered decks are copies, and there's a limit on how many
+    mydeck = passphraseDeck("foo")
+    mydeck.shuffle()
+    self.assertEqual(crypt("A"*15, passphraseDeck("foo")), "ITHZU JIWGR FARMW")
+    for i in range(MAXKEYED + 10):
+      passphraseDeck("key" + "q"*i)
+    self.assertEqual(len(sea._keyedDecks), MAXKEYED)
+    # no letters, no key: that would be the deck in order
+    for passphrase in ["", "1234", "  !? ", "CAFÉ", "straße"]:
+      self.assertRaises(Exception, passphraseDeck, passphrase)
+      self.assertRaises(Exception, keyDeck, Deck(), passphrase)
+      self.assertRaises(Exception, FastDeck().keyPassphrase, passphrase)
+    try:
+      passphraseDeck("secret café")
+    except Exception as e:
+      self.assertNotIn("secret", str(e))
+    self.assertEqual(passphraseLetters("Foo, 1 bar!"), "FOOBAR")
+    fd = FastDeck()
+    fd.keyPassphrase("f o-o")
+    self.assertEqual(fd.getOrder(), passphraseDeck("FOO").getOrder())
+    for passphrase in ["1234", "café"]:
+      command = ["./sea.py", "-p", passphrase, "-m", "datafiles/aaaaa"]
+      output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      self.assertEqual(output.returncode, 2)
+      self.assertEqual(output.stdout, b"")
+      self.assertNotIn(passphrase, output.stderr.decode())
+    # lots of threads keying (and evicting) at once
+    from concurrent.futures import ThreadPoolExecutor
+    phrases = ["key" + "q"*(i % (MAXKEYED + 40)) for i in range(2000)]
+    with ThreadPoolExecutor(8) as pool:
+      orders = list(pool.map(lambda p: passphraseDeck(p).getOrder(), phrases))
+    self.assertEqual(orders[MAXKEYED + 45], orders[5])
+    self.assertEqual(len(sea._keyedDecks), MAXKEYED)
+
+  def test_benchcompare(self):
+    """test benchmark results are flagged when slower than baseline"""
+    old = {"a": {"rate": 100.0}, "b": {"rate": 100.0}, "c": {"rate": 100.0}}
+    new = {"a": {"rate": 85.0}, "b": {"rate": 79.0}, "d": {"rate": 1.0}}
+    self.assertEqual(bench.compare(new, old, 0.2), [("b", 79.0, 100.0)])
+    result = bench.measure(lambda: generateKeystream(Deck(), 100, True), 100, 1,
+                           "letters/sec")
+    self.assertTrue(result["rate"] > 0 and result["peakbytes"] > 0)
+
+  def test_stats(self):
+    """test counted/timed keystream is the same keystream"""
+    self.doc.shuffle()
+    order = self.doc.getOrder()
+    refdeck = Deck(order)
+    expected = generateKeystream(refdeck, 200)
+    for fast in [True, False]:
+      runstats = Stats()
+      mydeck = Deck(order)
+      self.assertEqual(generateKeystream(mydeck, 200, fast, runstats), expected)
+      self.assertEqual(mydeck.getOrder(), refdeck.getOrder())
+      counts = runstats.counts
+      self.assertEqual(counts["outputCard"], 200 + counts.get("jokerSkips", 0))
+      self.assertEqual(counts["jokers"], counts["outputCard"])
+      self.assertTrue(runstats.times["tripleCut"] > 0)
+      self.assertTrue("jokers" in runstats.report("json"))
+    # the separate FastDeck steps add up to one fused step
+    fd = FastDeck(order)
+    parts = FastDeck(order)
+    for i in range(200):
+      outcard = fd.step()
+      parts.moveJokers()
+      parts.tripleCut()
+      parts.countCut()
+      self.assertEqual(parts.outputCard(), outcard)
+      self.assertEqual(parts.toBytes(), fd.toBytes())
+
+  def test_cycles(self):
+    """test Brent's cycle detection against just remembering every state"""
+    for modulus in [7, 255, 1000, 4099]:
+      f = lambda x: (x*x + 1) % modulus
+      seen = {}
+      x = 3
+      while x not in seen:
+        seen[x] = len(seen)
+        x = f(x)
+      result = cycles.brent(f, 3, 10**6)
+      self.assertTrue(result["found"])
+      self.assertEqual(result["tail"], seen[x])
+      self.assertEqual(result["period"], len(seen) - seen[x])
+      # same answer when stopped part way and resumed
+      saved = []
+      cycles.brent(f, 3, 10**6, 2, saved.append)
+      if len(saved) > 0:
+        resumed = cycles.brent(f, 3, 10**6, resume=saved[0])
+        self.assertEqual(resumed["period"], result["period"])
+        self.assertEqual(resumed["tail"], result["tail"])
+    state = FastDeck().toBytes()
+    self.assertFalse(cycles.brent(cycles.deckStep, state, 100)["found"])
+    fd = FastDeck()
+    fd.step()
+    self.assertEqual(cycles.deckStep(state), fd.toBytes())
+
+  @unittest.skipIf(numpy == None, "battery needs numpy")
+  def test_battery(self):
+    """test battery counts match counting the keystream directly"""
+    saveblock = battery.BLOCK
+    battery.BLOCK = 37      # so counts have to carry across blocks
+    counts = battery.runCounts(3, 500, 5, 1)
+    battery.BLOCK = saveblock
+    for decks, letters in [(0, 500), (3, 1)]:
+      self.assertRaises(Exception, battery.runCounts, decks, letters, 5, 1)
+      self.assertRaises(click.BadParameter, battery.main.callback,
+                        decks, letters, 5, 1, False)
+    letters = [0]*26
+    digrams = [0]*676
+    runs = 0
+    for i in range(3):
+      ks = [ord(ch)-65 for ch in battery.seededDeck(5, i).generateKeystream(500)]
+      for j in range(len(ks)):
+        letters[ks[j]] += 1
+        if j == 0 or (ks[j] >= 13) != (ks[j-1] >= 13):
+          runs += 1
+        if j > 0:
+          digrams[ks[j-1]*26 + ks[j]] += 1
+    self.assertEqual(counts["letters"].tolist(), letters)
+    self.assertEqual(counts["digrams"].tolist(), digrams)
+    self.assertEqual(counts["runs"], runs)
+    self.assertEqual(counts["pairs"], 3*499)
+    results = battery.runTests(counts)
+    for name in ["letters", "digrams", "serial", "runs"]:
+      self.assertTrue(0 <= results[name]["p"] <= 1)
+
+  @unittest.skipIf(numpy == None, "battery needs numpy")
+  def test_battery_uniform(self):
+    """test the battery doesn't find bias in uniform random letters"""
+    rng = numpy.random.default_rng(1)
+    counts = battery.emptyCounts()
+    for i in range(4000):
+      x = rng.integers(0, 26, 100).astype(numpy.int64)
+      counts["sequences"] += 1
+      battery.countBlock(counts, x, x)
+    results = battery.runTests(counts)
+    self.assertTrue(abs(results["runs"]["value"]) < 3)
+    self.assertTrue(results["letters"]["p"] > 0.001)
+
+  def test_keyring(self):
+    """test writing a keyring and looking keys up in it"""
+    fn = "datafiles/testring"
+    keys = []
+    for i in range(300):
+      self.doc.shuffle()
+      keys.append(("key%d" % (i), self.doc.getOrder()))
+    writeKeyring(fn, keys)
+    kr = Keyring(fn)
+    self.assertEqual(len(kr), 300)
+    self.assertEqual(list(kr.ids()), sorted([keyid for keyid, order in keys]))
+    for keyid, order in keys[::7]:
+      self.assertEqual(kr.getDeck(keyid).getOrder(), order)
+      self.assertEqual(kr.getPerm(keyid), FastDeck(order).toBytes())
+    self.assertFalse("key300" in kr)
+    self.assertRaises(Exception, kr.getDeck, "key300")
+    kr.close()
+    self.assertRaises(Exception, writeKeyring, fn, keys + [keys[0]])
+    self.assertRaises(Exception, writeKeyring, fn, [("bad", "AS"*54)])
+    self.assertRaises(Exception, writeKeyring, fn, [("x"*33, keys[0][1])])
+    for keyid in ["../../x", "/etc/x", "a/b", "a\\b", ".."]:
+      self.assertRaises(Exception, writeKeyring, fn, [(keyid, keys[0][1])])
+    # an ID like that in a keyring made some other way isn't exported
+    ofile = open(fn, "wb")
+    ofile.write(HEADER.pack(MAGIC, 1, IDSIZE, 0) + encodeId("../x") +
+                FastDeck().toBytes())
+    ofile.close()
+    with Keyring(fn) as kr:
+      self.assertEqual(list(kr.ids()), ["../x"])
+    outdir = "datafiles/testexport"
+    self.assertRaises(Exception, exportKeys.callback, fn, (), outdir)
+    self.assertFalse(os.path.exists(outdir))
+    self.assertFalse(os.path.exists("datafiles/x"))
+    # bad files are closed before the error
+    ofile = open(fn, "wb")
+    ofile.write(b"NOTARING" + bytes(100))
+    ofile.close()
+    self.assertRaises(Exception, Keyring, fn)
+    open(fn, "wb").close()
+    self.assertRaises(Exception, Keyring, fn)
+    os.remove(fn)
+
+  def test_ksindex(self):
+    """test seeking from an index gives the same keystream as from the key"""
+    fn = "datafiles/test.idx"
+    self.doc.shuffle()
+    ks = IndexedKeystream(self.doc, 50)
+    letters = ks.take(120) + "".join([next(ks) for i in range(40)]) + ks.take(300)
+    self.assertEqual(letters, generateKeystream(Deck(self.doc.getOrder()), 460, True))
+    self.assertEqual(len(ks.snapshots), 9)
+    ks.writeIndex(fn)
+    index = KeystreamIndex.load(fn)
+    self.assertEqual((index.every, index.letters), (50, 460))
+    for start in [0, 1, 49, 50, 51, 333, 450]:
+      self.assertEqual(index.seek(self.doc, start).take(10), letters[start:start+10])
+    self.assertEqual(index.seek(self.doc, 460).count, 460)
+    self.assertRaises(Exception, index.seek, self.doc, 461)
+    self.assertRaises(Exception, index.seek, Deck(), 100)
+    ofile = open(fn, "ab")
+    ofile.write(b"x")
+    ofile.close()
+    self.assertRaises(Exception, KeystreamIndex.load, fn)
+    os.remove(fn)
+    ciphertext = combine(codec.pad(codec.clean("x"*460)), letters)
+    sea.decryptRange(ciphertext, self.doc, (123, 140), '', "datafiles/test.out")
+    self.assertEqual(readFile("datafiles/test.out").strip(), codec.fives("X"*17))
+    os.remove("datafiles/test.out")
+    # decrypting only reads --index for --range, so it won't quietly ignore it
+    command = "./sea.py -d -k datafiles/inorder -m datafiles/cs --index " + fn
+    output = subprocess.run(command.split(), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    self.assertEqual(output.returncode, 2)
+    self.assertIn("--range", output.stderr.decode())
+
+  def test_segments(self):
+    """test segmented messages: same for any jobs, segments independent"""
+    msg = "".join([choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for i in range(1003)])
+    d = readCards("datafiles/keyfile")
+    text = segments.encryptSegmented(msg, d, 100)
+    self.assertEqual(text, segments.encryptSegmented(msg, d, 100, jobs=2))
+    segsize, count, body = segments.parseHeader(text)
+    self.assertEqual((segsize, count), (100, 11))
+    ciphertext = codec.clean(body)
+    seg3 = segments.segmentDeck(d.getOrder(), 3).generateKeystream(100)
+    self.assertEqual(ciphertext[300:400], codec.addLetters(msg[300:400], seg3))
+    self.assertEqual(segments.decryptSegmented(text, d, jobs=2), codec.pad(msg))
+    for span in [(0, 5), (95, 105), (250, 250), (990, None), (300, 5000), (2000, None)]:
+      start, end = span
+      self.assertEqual(segments.decryptSegmented(text, d, 1, span), codec.pad(msg)[start:end])
+    fn = "datafiles/test.seg"
+    ofile = open(fn, "w")
+    ofile.write(text + "\n")
+    ofile.close()
+    run(fn, False, fn + ".out", "datafiles/keyfile", "fast", False, "", "",
+        span=(195, 212))
+    with open(fn + ".out") as inf:
+      self.assertEqual(inf.read(), codec.fives(msg[195:212]) + "\n")
+    os.remove(fn)
+    os.remove(fn + ".out")
+    self.assertTrue(segments.isSegmented(text))
+    self.assertFalse(segments.isSegmented(codec.fives(ciphertext)))
+    self.assertRaises(Exception, segments.decryptSegmented, text[:-6], d)
+    self.assertRaises(Exception, segments.decryptSegmented, text.replace(" 11", " x"), d)
+    self.assertEqual(segments.segmentKey(27), "SEGMENTAAAAABB")
+    self.assertRaises(Exception, segments.segmentKey, 26**7)
+
+  def test_pipe(self):
+    """test pipe mode: each message like its own sea.py run"""
+    msgs = ["hello world", "", "Do not use PC", "x"*100]
+    d = readCards("datafiles/keyfile")
+    expected = [crypt(msg, readCards("datafiles/keyfile")) for msg in msgs]
+    for fast in [True, False]:
+      outf = io.BytesIO()
+      lines = "\n".join(msgs) + "\n"
+      self.assertEqual(pipeCrypt(io.BytesIO(lines.encode()), outf, d, True,
+                                 "lines", fast), 4)
+      self.assertEqual(outf.getvalue().decode().split("\n")[:-1], expected)
+    framed = b"".join([b"%d\n%s\n" % (len(e), e.encode()) for e in expected])
+    outf = io.BytesIO()
+    pipeCrypt(io.BytesIO(framed), outf, d, False, "length")
+    decrypted = list(readMessages(io.BytesIO(outf.getvalue()), "length"))
+    self.assertEqual(decrypted, [codec.fives(codec.pad(codec.clean(msg)))
+                                 for msg in msgs])
+    self.assertRaises(Exception, list, readMessages(io.BytesIO(b"9\nabc"), "length"))
+    self.assertRaises(Exception, list, readMessages(io.BytesIO(b"x\nabc"), "length"))
+    ks = Keystream(d)
+    pipeCrypt(io.BytesIO(b"abcde\nabcde\n"), io.BytesIO(), ks)
+    self.assertEqual(ks.count, 10)
+
+  def test_keysearch(self):
+    """test the known-plaintext search finds the key, same for any jobs"""
+    self.doc.shuffle()
+    order = self.doc.getOrder()
+    plaintext = codec.pad(codec.clean("attack at dawn, bring coffee"))
+    ciphertext = codec.clean(crypt(plaintext, Deck(order)))
+    partial = order
+    for i in [0, 7, 30, 53]:
+      partial = partial[:2*i] + "??" + partial[2*i+2:]
+    template, holes, missing = keysearch.parsePartial(partial)
+    self.assertEqual((holes, len(missing)), ([0, 7, 30, 53], 4))
+    want = keysearch.wantedKeystream([(0, plaintext[:10], ciphertext[:10]),
+                                      (15, plaintext[15:], ciphertext[15:])])
+    self.assertEqual(want[10:15], [None]*5)
+    tested = []
+    found = keysearch.search(template, holes, missing, want, 1, tested.append)
+    self.assertEqual(tested[-1], 24)
+    self.assertTrue(bytes(FastDeck(order).perm) in found)
+    self.assertEqual(found, keysearch.search(template, holes, missing, want, 2))
+    self.assertRaises(Exception, keysearch.parsePartial, "AC"*54)
+    self.assertRaises(Exception, keysearch.wantedKeystream, [(0, "AB", "A")])
+
+  def test_shoe(self):
+    """test shoe dealing, reset and seeded reshuffles"""
+    s = Shoe(6, seed=7)
+    self.assertEqual(len(s), 312)
+    first = s.deal(5)
+    self.assertEqual(len(s), 307)
+    upnext = str(s)[:2]
+    self.assertEqual(str(s.dealCard()), upnext)
+    s.reset()
+    self.assertEqual(s.deal(5), first)
+    self.assertEqual(Shoe(6, seed=7).deal(5), first)
+    self.assertTrue(first[0] is Card(first[0].getRank(), first[0].getSuit()))
+    s.reset()
+    cards = s.deal(312)
+    self.assertTrue(s.isEmpty())
+    self.assertRaises(Exception, s.dealCard)
+    self.assertRaises(Exception, s.deal, 1)
+    counts = {}
+    for c in cards:
+      counts[str(c)] = counts.get(str(c), 0) + 1
+    self.assertEqual(sorted(set(counts.values())), [6])
+    self.assertFalse("LJ" in counts)
+    s.reshuffle()
+    self.assertEqual(len(s), 312)
+    self.assertNotEqual(s.deal(312), cards)
+    self.assertEqual(len(Shoe(2, jokers=True)), 108)
+    self.assertEqual(sorted(Shoe(1, seed=3).dealOrdinals(52)), list(range(52)))
+
+  def test_keygen(self):
+    """test random key generation and the uniqueness check"""
+    keys = keygen.generateKeys(300, "k", unique=True)
+    self.assertEqual([keyid for keyid, perm in keys[:2]], ["k001", "k002"])
+    self.assertEqual(len(set([perm for keyid, perm in keys])), 300)
+    for keyid, perm in keys:
+      self.assertEqual(sorted(perm), list(range(54)))
+    # every card should turn up in the top spot now and then
+    self.assertTrue(len(set([perm[0] for keyid, perm in keys])) > 40)
+    fn = "datafiles/test.ring"
+    writeKeyring(fn, keys)
+    with Keyring(fn) as kr:
+      self.assertEqual(kr.getPerm("k150"), keys[149][1])
+    os.remove(fn)
+    token_bytes = keygen.secrets.token_bytes
+    keygen.secrets.token_bytes = lambda n: bytes(n)
+    try:
+      self.assertEqual(len(keygen.generateKeys(5)), 5)
+      self.assertRaises(Exception, keygen.generateKeys, 5, "k", True)
+    finally:
+      keygen.secrets.token_bytes = token_bytes
+    outdir = "datafiles/testkeys"
+    keygen.main.callback(3, "", outdir, "k", False)
+    self.assertEqual(sorted(os.listdir(outdir)), ["k1", "k2", "k3"])
+    self.assertEqual(os.stat(os.path.join(outdir, "k2")).st_mode & 0o777, 0o600)
+    with open(os.path.join(outdir, "k2")) as inf:
+      before = inf.read()
+    # k1..k3 are there already, so nothing gets written
+    self.assertRaises(click.UsageError, keygen.main.callback, 4, "", outdir, "k", False)
+    self.assertFalse(os.path.exists(os.path.join(outdir, "k4")))
+    with open(os.path.join(outdir, "k2")) as inf:
+      self.assertEqual(inf.read(), before)
+    self.assertRaises(Exception, writeKeyfile, os.path.join(outdir, "k1"),
+                      Deck().getOrder(), "again", False)
+    for fn in os.listdir(outdir):
+      os.remove(os.path.join(outdir, fn))
+    os.rmdir(outdir)
+
+  def test_conformance(self):
+    """every engine matches the Deck path; a broken one gets caught"""
+    report = conformance.run(conformance.ENGINES, 0.2, 60)
+    self.assertEqual(report["failures"], {})
+    self.assertTrue(report["decks"] > 70)
+    for order in conformance.adversarialOrders(Random(1))[:9]:
+      self.assertTrue(Deck.fromOrder(order)._valid())
+    order = conformance.placeJokers(Deck().getOrder(), 53, 0, "KS")
+    self.assertEqual((order[:2], order[-2:]), ("BJ", "LJ"))
+    # big joker wraps to the wrong spot off the bottom of the deck
+    class Broken(FastDeck):
+      def moveJokers(self):
+        FastDeck.moveJokers(self)
+        if self.perm[1] == BJ and self.perm[0] != LJ:
+          self.perm[1], self.perm[2] = self.perm[2], self.perm[1]
+    def broken(order, n):
+      fd = Broken(order)
+      return timedKeystream(fd, n, True, Stats()), fd.getOrder()
+    report = conformance.run({"broken": broken}, 0, 60)
+    failure = report["failures"]["broken"]
+    self.assertTrue(conformance.firstDifference(broken, failure["order"],
+                    failure["letters"]) != None)
+    self.assertEqual(failure["expected"][:-1], failure["got"][:-1])
+    self.assertEqual(len(failure["got"]), failure["letters"])
+
+  def test_packed(self):
+    """test packing letters 5 bits each, and sea.py --format packed"""
+    for n in list(range(20)) + [1000, 1003]:
+      letters = "".join([choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for i in range(n)])
+      data = packed.pack(letters)
+      self.assertEqual(len(data), packed.HEADER.size + 5*((n+7)//8))
+      self.assertEqual(packed.unpack(data), letters)
+    # first letter in the top bits: Z=25=11001, Y=24=11000, then A's
+    self.assertEqual(packed.pack("ZY")[packed.HEADER.size:], b"\xce\x00\x00\x00\x00")
+    self.assertEqual(packed.parseHeader(packed.pack("ZY"))[:2], (6, 2))
+    self.assertRaises(Exception, packed.pack, "abc")
+    self.assertRaises(Exception, packed.unpack, b"ABCDE FGHIJ")
+    self.assertRaises(Exception, packed.unpack, packed.pack("ABCDEFGHI")[:-1])
+    self.assertRaises(Exception, packed.unpack, packed.pack("Z")[:-5] + b"\xff"*5)
+    fn = "datafiles/test.packed"
+    with open("datafiles/msg") as inf:
+      msg = inf.read()
+    run("datafiles/msg", True, fn, "datafiles/keyfile", "fast", False, "", "",
+        fmt="packed")
+    with open(fn, "rb") as inf:
+      ciphertext = packed.unpack(inf.read())
+    self.assertEqual(codec.fives(ciphertext), crypt(msg, readCards("datafiles/keyfile")))
+    run(fn, False, fn + ".out", "datafiles/keyfile", "fast", False, "", "",
+        fmt="packed")
+    with open(fn + ".out") as inf:
+      self.assertEqual(inf.read(), codec.fives(codec.pad(codec.clean(msg))) + "\n")
+    os.remove(fn)
+    os.remove(fn + ".out")
+
+  @unittest.skipIf(lockstep == None, "lockstep needs numpy")
+  def test_lockstep(self):
+    """test batch keystreams match each deck's own generateKeystream"""
+    rng = Random(2)
+    orders = conformance.adversarialOrders(rng)[:30]
+    orders += [conformance.randomOrder(rng) for i in range(30)]
+    lengths = [rng.randrange(200) for order in orders]
+    ksb = lockstep.KeystreamBatch([Deck(order) for order in orders])
+    self.assertEqual(len(ksb), 60)
+    streams = ksb.generateKeystreams(lengths)
+    decks = ksb.getDecks()
+    for order, n, ks, fd in zip(orders, lengths, streams, decks):
+      d = Deck(order)
+      self.assertEqual(ks, generateKeystream(d, n))
+      self.assertEqual(fd.getOrder(), d.getOrder())
+    # carries on from where each deck got to
+    streams = ksb.generateKeystreams(20)
+    self.assertEqual(streams, [fd.generateKeystream(20) for fd in decks])
+    self.assertEqual(lockstep.KeystreamBatch([]).generateKeystreams(5), [])
+    msgs = ["Meet me at ten", "", "Do not use PC"]
+    keys = [readCards("datafiles/keyfile"), Deck(), Deck(orders[5])]
+    encrypted = lockstep.cryptMessages(msgs, keys)
+    self.assertEqual(encrypted, [crypt(msg, FastDeck.fromDeck(d)) for msg, d in zip(msgs, keys)])
+    self.assertEqual(lockstep.cryptMessages(encrypted, keys, False),
+                     [codec.fives(codec.pad(codec.clean(msg))) for msg in msgs])
+
+  def test_service(self):
+    """service en/decrypts like crypt(), turns away extra sessions"""
+    sock = "datafiles/test.sock"
+    text = "Meet me at the usual place at ten rather than eight"
+    async def talk():
+      server = await service.startServer(service.Server(1, 2, "datafiles"), socket=sock)
+      reader, writer = await service.connect(socket=sock)
+      header = {"direction": "encrypt", "key": "keyfile"}
+      enc = await service.request(reader, writer, header, [text[:7], text[7:]])
+      header["direction"] = "decrypt"
+      dec = await service.request(reader, writer, header, [enc])
+      errors = []
+      for bad in [{"direction": "encrypt"}, {"key": "nosuch"},
+                  {"key": "../datafiles/keyfile"}, {"key": "/etc/passwd"},
+                  {"key": "msg"}, {"passphrase": "1234"}]:
+        try:
+          await service.request(reader, writer, bad, [text])
+        except Exception as e:
+          errors.append(str(e))
+      # only one session allowed, and it's still open
+      reader2, writer2 = await service.connect(socket=sock)
+      with self.assertRaises(Exception):
+        await service.request(reader2, writer2, header, [text])
+      writer2.close()
+      writer.close()
+      server.close()
+      await server.wait_closed()
+      return enc, dec, errors
+    stderr = sys.stderr
+    sys.stderr = io.StringIO()
+    try:
+      enc, dec, errors = service.asyncio.run(talk())
+    finally:
+      sys.stderr = stderr
+    self.assertEqual(codec.fives(enc), crypt(text, readCards("datafiles/keyfile")))
+    self.assertEqual(dec, codec.pad(codec.clean(text)))
+    self.assertEqual(len(errors), 6)
+    self.assertEqual(errors[1:4], ["service error: unknown key"]*3)
+    # datafiles/msg isn't a keyfile, but the client isn't told about it
+    self.assertEqual(errors[4], "service error: request failed")
+    self.assertNotIn("1234", errors[5])
+    os.remove(sock)
+    # keys from a keyring instead
+    fn = "datafiles/test.ring"
+    writeKeyring(fn, [("alice", readCards("datafiles/keyfile").getOrder())])
+    server = service.Server(1, 1, keyring=fn)
+    self.assertEqual(service.headerDeck({"key": "alice"}, keyring=server.keyring).getOrder(),
+                     readCards("datafiles/keyfile").getOrder())
+    self.assertRaises(service.RequestError, service.headerDeck, {"key": "bob"},
+                      keyring=server.keyring)
+    self.assertRaises(service.RequestError, service.headerDeck, {"key": "keyfile"})
+    server.close()
+    os.remove(fn)
+
   def test_encryptdecrypt(self):
     """make sure we get back original message"""
     alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"